@@ -1,57 +1,223 @@
-import tensorflow as tf
 import numpy as np
-import librosa
 
 from setup import Setup
+from instrumentation import span
+from lazy_imports import lazy_import
+from resampler import create_streaming_resampler, resample
+
+tf = lazy_import("tensorflow")
+sf = lazy_import("soundfile")
+
+class DecodedAudio:
+    """Decoded audio resampled to the processing sample rate
+
+    samples is 1-D for mono and (channels, samples) otherwise.
+    """
+    def __init__(self, samples, sample_rate, original_sample_rate):
+        self.samples = samples
+        self.sample_rate = sample_rate
+        self.original_sample_rate = original_sample_rate
+
+    def __len__(self):
+        """Samples per channel"""
+        return self.samples.shape[-1]
+
+    @property
+    def channels(self):
+        return 1 if self.samples.ndim == 1 else self.samples.shape[0]
+
+    @property
+    def duration(self):
+        """Duration in seconds"""
+        return len(self) / self.sample_rate
 
 class AudioProcessor:
-    def __init__(self, target_sample_rate=Setup.SAMPLE_RATE):
+    def __init__(self, target_sample_rate=Setup.SAMPLE_RATE, resample_quality=Setup.RESAMPLE_QUALITY,
+                 keep_channels=Setup.KEEP_CHANNELS):
         self.target_sample_rate = target_sample_rate
+        self.resample_quality = resample_quality
+        # Multi-channel files load as (channels, samples) instead of their first channel
+        self.keep_channels = keep_channels
+
+    def load(self, source):
+        """Decode and resample an audio file once, DecodedAudio is returned as is
 
-    def get_audio_in_batches(self, path, batching_size=12000):
-        """Load and process audio file in batches"""
-        audio, sample_rate = tf.audio.decode_wav(
-            tf.io.read_file(path), desired_channels=1)
-        audio_np = audio.numpy().squeeze()
+        A numpy array is taken as mono or (channels, samples) audio at the
+        target sample rate.
+        """
+        if isinstance(source, DecodedAudio):
+            return source
+        if isinstance(source, np.ndarray):
+            samples = np.asarray(source, dtype=np.float32)
+            if samples.ndim != 2 or len(samples) == 1:
+                samples = samples.reshape(-1)
+            return DecodedAudio(samples, self.target_sample_rate, self.target_sample_rate)
+
+        with span("decode"):
+            audio, sample_rate = tf.audio.decode_wav(
+                tf.io.read_file(source), desired_channels=-1 if self.keep_channels else 1)
+            audio_np = audio.numpy()
+            # decode_wav returns (frames, channels)
+            audio_np = np.ascontiguousarray(audio_np.T) if audio_np.shape[1] > 1 else audio_np.squeeze(axis=1)
+            sample_rate = int(sample_rate.numpy())
 
         if sample_rate != self.target_sample_rate:
-            audio_np = librosa.resample(
-                audio_np, 
-                orig_sr=sample_rate.numpy(), 
-                target_sr=self.target_sample_rate
-            )
-
-        audio_batches = []
-        total_samples = len(audio_np)
-        
-        for i in range(0, total_samples, batching_size):
-            batch = audio_np[i:i + batching_size]
-            if len(batch) < batching_size:
-                batch = np.pad(batch, (0, batching_size - len(batch)), mode='constant')
-            audio_batches.append(batch)
-
-        return tf.stack(audio_batches)
-
-    def get_audio(self, path):
+            with span("resample", orig_sr=sample_rate):
+                audio_np = resample(
+                    audio_np, 
+                    orig_sr=sample_rate, 
+                    target_sr=self.target_sample_rate,
+                    quality=self.resample_quality
+                )
+
+        return DecodedAudio(audio_np, self.target_sample_rate, sample_rate)
+
+    def get_audio_in_batches(self, source, batching_size=12000):
+        """Load audio and return it as a (n_chunks, batching_size) array"""
+        samples = self.load(source).samples
+        with span("chunk"):
+            return self.chunk_audio(samples, batching_size)
+
+    @staticmethod
+    def chunk_audio(samples, batching_size=12000):
+        """Split samples into zero-padded chunks backed by a single buffer
+
+        (channels, samples) audio gives the chunks of every channel one
+        after another, so all channels go through the model together.
+        """
+        length = samples.shape[-1]
+        n_chunks = -(-length // batching_size)
+        if length == n_chunks * batching_size and samples.dtype == np.float32:
+            # Already aligned, reshape without copying
+            return np.ascontiguousarray(samples).reshape(-1, batching_size)
+
+        buffer = np.zeros(samples.shape[:-1] + (n_chunks * batching_size,), dtype=np.float32)
+        buffer[..., :length] = samples
+        return buffer.reshape(-1, batching_size)
+
+    @staticmethod
+    def unchunk(chunks, length, channels=1):
+        """Join chunk_audio() output back into `length` samples per channel"""
+        if channels > 1:
+            return chunks.reshape(channels, -1)[:, :length]
+        return chunks.reshape(-1)[:length]
+
+    @staticmethod
+    def frame_audio(samples, batching_size=12000, overlap=0):
+        """Split samples into overlapping frames, a strided view of one padded buffer
+
+        The signal is padded with `overlap` zeros in front so every real sample
+        lies outside the fade-in of the first frame; overlap_add() removes it.
+        (channels, samples) audio gives the frames of every channel in turn.
+        """
+        if samples.ndim > 1:
+            return np.concatenate([AudioProcessor.frame_audio(channel, batching_size, overlap)
+                                   for channel in samples])
+        hop = batching_size - overlap
+        covered = len(samples) + 2 * overlap
+        n_frames = max(1, -(-(covered - batching_size) // hop) + 1)
+
+        buffer = np.zeros((n_frames - 1) * hop + batching_size, dtype=np.float32)
+        buffer[overlap:overlap + len(samples)] = samples
+        return np.lib.stride_tricks.as_strided(
+            buffer,
+            shape=(n_frames, batching_size),
+            strides=(hop * buffer.itemsize, buffer.itemsize),
+            writeable=False
+        )
+
+    @staticmethod
+    def crossfade_window(batching_size, overlap, shape='hann'):
+        """Window that is flat in the middle and fades over `overlap` samples at each end
+
+        Fade-outs and fade-ins of neighbouring frames sum to exactly one.
+        """
+        window = np.ones(batching_size, dtype=np.float32)
+        if overlap:
+            position = (np.arange(overlap) + 0.5) / overlap
+            if shape == 'hann':
+                ramp = 0.5 - 0.5 * np.cos(np.pi * position)
+            elif shape == 'linear':
+                ramp = position
+            else:
+                raise ValueError(f"Unknown crossfade window: {shape}")
+            window[:overlap] = ramp
+            window[-overlap:] = ramp[::-1]
+        return window
+
+    @staticmethod
+    def overlap_add(frames, length, overlap=0, shape='hann', channels=1):
+        """Crossfade frames from frame_audio() back into a signal of `length` samples"""
+        if channels > 1:
+            return np.stack([AudioProcessor.overlap_add(part, length, overlap, shape)
+                             for part in np.split(frames, channels)])
+        n_frames, batching_size = frames.shape
+        hop = batching_size - overlap
+        frames *= AudioProcessor.crossfade_window(batching_size, overlap, shape)
+
+        # Add frame segment j of every frame in one slice per segment offset
+        n_segments = -(-batching_size // hop)
+        output = np.zeros((n_frames + n_segments) * hop, dtype=np.float32)
+        for j in range(n_segments):
+            segment = frames[:, j * hop:(j + 1) * hop]
+            target = output[j * hop:(j + n_frames) * hop].reshape(n_frames, hop)
+            target[:, :segment.shape[1]] += segment
+
+        return output[overlap:overlap + length]
+
+    def get_audio(self, source):
         """Load complete audio file"""
-        audio, sample_rate = tf.audio.decode_wav(
-            tf.io.read_file(path), desired_channels=1)
-        audio_np = audio.numpy().squeeze()
+        return self.load(source).samples
 
-        if sample_rate != self.target_sample_rate:
-            audio_np = librosa.resample(
-                audio_np, 
-                orig_sr=sample_rate.numpy(), 
-                target_sr=self.target_sample_rate
-            )
+    def iter_blocks(self, path, block_size):
+        """Read, downmix and resample a file lazily in blocks of block_size samples"""
+        info = sf.info(path)
+        resampler = None
+        read_size = block_size
+        if info.samplerate != self.target_sample_rate:
+            resampler = create_streaming_resampler(info.samplerate, self.target_sample_rate,
+                                                   self.resample_quality)
+            read_size = -(-block_size * info.samplerate // self.target_sample_rate)
+
+        pending = np.zeros(0, dtype=np.float32)
+        for block in sf.blocks(path, blocksize=read_size, dtype='float32', always_2d=True):
+            # decode_wav with desired_channels=1 keeps the first channel
+            samples = block[:, 0]
+            if resampler is not None:
+                samples = resampler.process(samples)
+            pending = np.concatenate((pending, samples))
+            while len(pending) >= block_size:
+                yield pending[:block_size]
+                pending = pending[block_size:]
+
+        if resampler is not None:
+            pending = np.concatenate((pending, resampler.flush()))
+        for start in range(0, len(pending), block_size):
+            yield pending[start:start + block_size]
+
+    @staticmethod
+    def to_pcm16(audio_data):
+        """Quantize samples to int16 the same way tf.audio.encode_wav does"""
+        scaled = np.clip(audio_data, -1.0, 1.0) * 32768.0
+        # Round half away from zero like std::round, np.round rounds half to even
+        scaled = np.copysign(np.floor(np.abs(scaled) + 0.5), scaled)
+        return np.clip(scaled, -32768, 32767).astype(np.int16)
 
-        return audio_np
+    def open_writer(self, output_path):
+        """Open a 16-bit WAV file for incremental writes"""
+        return sf.SoundFile(output_path, 'w', samplerate=self.target_sample_rate,
+                            channels=1, format='WAV', subtype='PCM_16')
 
     def save_audio(self, audio_data, output_path):
-        """Save audio data to file"""
-        audio_tensor = tf.convert_to_tensor(audio_data, dtype=tf.float32)
-        audio_tensor = tf.reshape(audio_tensor, [-1, 1])
-        tf.io.write_file(
-            output_path,
-            tf.audio.encode_wav(audio_tensor, sample_rate=self.target_sample_rate)
-        )
\ No newline at end of file
+        """Save mono or (channels, samples) audio data to file"""
+        with span("save"):
+            audio_tensor = tf.convert_to_tensor(audio_data, dtype=tf.float32)
+            # encode_wav takes (frames, channels)
+            if audio_tensor.shape.rank > 1:
+                audio_tensor = tf.transpose(audio_tensor)
+            else:
+                audio_tensor = tf.reshape(audio_tensor, [-1, 1])
+            tf.io.write_file(
+                output_path,
+                tf.audio.encode_wav(audio_tensor, sample_rate=self.target_sample_rate)
+            )
\ No newline at end of file
@@ -0,0 +1,64 @@
+"""Import-time regression check for the application entry points
+
+Run from the repository root:
+    python benchmarks/import_time.py [--budget 1.0]
+
+Each entry point is imported in a fresh interpreter. The script fails if
+the best of several runs exceeds the budget or if a heavy dependency is
+imported eagerly.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENTRY_POINTS = ["gui", "cli", "main", "audio_processor", "model_handler", "filters", "filter_chain"]
+
+# Modules that must only load when they are actually used
+HEAVY_MODULES = ["tensorflow", "librosa", "matplotlib", "scipy.signal", "sounddevice", "soundfile"]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+def measure(module, repeats):
+    """Import `module` in fresh interpreters and return (best seconds, eagerly loaded modules)"""
+    best = None
+    loaded = []
+    for _ in range(repeats):
+        result = subprocess.run(
+            [sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY_MODULES)],
+            cwd=ROOT, capture_output=True, text=True, check=True
+        )
+        report = json.loads(result.stdout.strip().splitlines()[-1])
+        best = report["seconds"] if best is None else min(best, report["seconds"])
+        loaded = report["loaded"]
+    return best, loaded
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget", type=float, default=1.0, help="Maximum import time in seconds")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    failed = False
+    for module in ENTRY_POINTS:
+        seconds, loaded = measure(module, args.repeats)
+        status = "ok"
+        if seconds > args.budget or loaded:
+            status = "FAIL"
+            failed = True
+        extra = f", eagerly imports {', '.join(loaded)}" if loaded else ""
+        print(f"{status:4} {module:16} {seconds * 1000:8.1f} ms{extra}")
+
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
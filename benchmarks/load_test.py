@@ -0,0 +1,153 @@
+"""Load test for the local HTTP denoising service
+
+Run from the repository root against a running server:
+    python benchmarks/load_test.py --port 8080 [--concurrency 16] [--requests 200]
+
+or let the script start one, with a stand-in model if none is downloaded:
+    python benchmarks/load_test.py --spawn [--tiny-model]
+
+Each client keeps one connection open and posts the input file in a
+loop. Latency percentiles, throughput and rejected requests are printed,
+followed by the server's batching metrics.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from setup import Setup
+
+async def request(reader, writer, host, method, path, body=b"", content_type="audio/wav"):
+    """Send one keep-alive request and return (status, body)"""
+    head = (f"{method} {path} HTTP/1.1\r\nHost: {host}\r\n"
+            f"Content-Type: {content_type}\r\nContent-Length: {len(body)}\r\n\r\n")
+    writer.write(head.encode('latin-1') + body)
+    await writer.drain()
+
+    status_line = await reader.readuntil(b"\r\n")
+    status = int(status_line.split()[1])
+    headers = {}
+    while True:
+        line = (await reader.readuntil(b"\r\n")).decode('latin-1').strip()
+        if not line:
+            break
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    payload = await reader.readexactly(int(headers.get('content-length', 0)))
+    return status, payload
+
+async def client(host, port, body, content_type, deadline_count, counter, results):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while counter[0] < deadline_count:
+            counter[0] += 1
+            start = time.perf_counter()
+            status, _ = await request(reader, writer, host, "POST", "/denoise", body, content_type)
+            results.append((status, time.perf_counter() - start))
+    finally:
+        writer.close()
+
+async def fetch_json(host, port, path):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        status, payload = await request(reader, writer, host, "GET", path)
+        return json.loads(payload) if status == 200 else None
+    finally:
+        writer.close()
+
+async def wait_until_ready(host, port, process, timeout):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError("Server exited during startup")
+        try:
+            if await fetch_json(host, port, "/health"):
+                return
+        except OSError:
+            pass
+        await asyncio.sleep(0.5)
+    raise RuntimeError(f"Server not ready after {timeout} seconds")
+
+async def run(args, body, content_type, audio_seconds):
+    results = []
+    counter = [0]
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        client(args.host, args.port, body, content_type, args.requests, counter, results)
+        for _ in range(args.concurrency)
+    ))
+    elapsed = time.perf_counter() - start
+
+    ok = np.array([latency for status, latency in results if status == 200])
+    rejected = sum(1 for status, _ in results if status == 503)
+    failed = len(results) - len(ok) - rejected
+    print(f"{len(results)} requests with {args.concurrency} clients in {elapsed:.2f}s: "
+          f"{len(ok)} ok, {rejected} rejected, {failed} failed")
+    if len(ok):
+        p50, p95, p99 = np.percentile(ok, [50, 95, 99])
+        print(f"Latency p50 {p50 * 1000:.1f} ms, p95 {p95 * 1000:.1f} ms, p99 {p99 * 1000:.1f} ms, "
+              f"max {ok.max() * 1000:.1f} ms")
+        print(f"Throughput {len(ok) / elapsed:.1f} requests/s, "
+              f"{len(ok) * audio_seconds / elapsed:.1f}x real time")
+
+    metrics = await fetch_json(args.host, args.port, "/metrics")
+    if metrics:
+        print(f"Server: {metrics['batches']} batches, {metrics['mean_batch_requests']:.2f} requests and "
+              f"{metrics['mean_batch_chunks']:.1f} chunks per batch on average")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default=Setup.SERVER_HOST)
+    parser.add_argument("--port", type=int, default=Setup.SERVER_PORT)
+    parser.add_argument("--input", default=os.path.join(ROOT, "test", "9.wav"), help="WAV file to post")
+    parser.add_argument("--raw", action="store_true", help="Post raw big-endian 16-bit PCM instead of WAV")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--spawn", action="store_true", help="Start a server for the test")
+    parser.add_argument("--model", default=Setup.MODEL_PATH, help="Model for the spawned server")
+    parser.add_argument("--tiny-model", action="store_true", help="Spawn the server with a stand-in model")
+    parser.add_argument("--startup-timeout", type=float, default=120.0)
+    args = parser.parse_args(argv)
+
+    import soundfile as sf
+    samples, sample_rate = sf.read(args.input, dtype='int16', always_2d=True)
+    audio_seconds = len(samples) / sample_rate
+    if args.raw:
+        body = samples[:, 0].astype('>i2').tobytes()
+        content_type = f"audio/L16; rate={sample_rate}"
+    else:
+        with open(args.input, 'rb') as f:
+            body = f.read()
+        content_type = "audio/wav"
+
+    process = None
+    with tempfile.TemporaryDirectory(prefix="nocle-load-") as directory:
+        try:
+            if args.spawn:
+                model_path = args.model
+                if args.tiny_model or not os.path.exists(model_path):
+                    from suite import build_tiny_model
+                    model_path = build_tiny_model(os.path.join(directory, "tiny.hdf5"))
+                process = subprocess.Popen(
+                    [sys.executable, os.path.join(ROOT, "server.py"), "--host", args.host,
+                     "--port", str(args.port), "--model", model_path],
+                    cwd=ROOT
+                )
+            asyncio.run(wait_until_ready(args.host, args.port, process, args.startup_timeout))
+            asyncio.run(run(args, body, content_type, audio_seconds))
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait()
+
+if __name__ == "__main__":
+    main()
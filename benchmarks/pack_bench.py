@@ -0,0 +1,76 @@
+"""Throughput on many short clips, per file against chunks packed across files
+
+Run from the repository root:
+    python benchmarks/pack_bench.py [--clips 1000] [--max-seconds 3]
+
+Clips of random length up to --max-seconds are cut from test/*.wav and
+denoised three ways: predict() per clip, predict_many() over all clips
+and predict() on one signal of the same total length, the upper bound
+for packing. Outputs of predict_many() are checked against predict().
+"""
+import argparse
+import glob
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from audio_processor import AudioProcessor
+from setup import Setup
+from suite import best_time, build_tiny_model
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default=Setup.MODEL_PATH)
+    parser.add_argument("--tiny-model", action="store_true", help="Use a small stand-in model")
+    parser.add_argument("--clips", type=int, default=1000)
+    parser.add_argument("--max-seconds", type=float, default=3.0, help="Longest clip")
+    parser.add_argument("--formats", nargs="+", default=["keras", "tflite"],
+                        choices=["keras", "savedmodel", "tflite"])
+    parser.add_argument("--repeats", type=int, default=2)
+    args = parser.parse_args(argv)
+
+    from model_handler import ModelHandler
+
+    audio_processor = AudioProcessor()
+    sources = [audio_processor.load(path).samples for path in sorted(glob.glob(os.path.join(ROOT, "test", "*.wav")))]
+    rng = np.random.default_rng(0)
+    clips = []
+    for i in range(args.clips):
+        samples = sources[i % len(sources)]
+        length = int(rng.integers(1, min(len(samples), args.max_seconds * Setup.SAMPLE_RATE) + 1))
+        clips.append(samples[:length])
+    audio_seconds = sum(len(clip) for clip in clips) / Setup.SAMPLE_RATE
+    joined = np.concatenate(clips)
+
+    with tempfile.TemporaryDirectory(prefix="nocle-pack-") as directory:
+        model_path = args.model
+        if args.tiny_model or not os.path.exists(model_path):
+            print("Using a stand-in model")
+            model_path = build_tiny_model(os.path.join(directory, "tiny.hdf5"))
+
+        print(f"{len(clips)} clips, {audio_seconds:.0f}s of audio")
+        print(f"{'format':>10} {'method':>12} {'x realtime':>11} {'output':>10}")
+        for artifact_format in args.formats:
+            model_handler = ModelHandler(model_path, audio_processor, artifact_format=artifact_format)
+            per_file_time, reference = best_time(
+                lambda: [model_handler.predict(clip) for clip in clips], args.repeats)
+            packed_time, packed = best_time(lambda: model_handler.predict_many(clips), args.repeats)
+            joined_time, _ = best_time(lambda: model_handler.predict(joined), args.repeats)
+
+            check = "identical" if all(np.array_equal(a, b) for a, b in zip(packed, reference)) else \
+                f"{max(float(np.abs(a - b).max()) for a, b in zip(packed, reference)):.1e}"
+            name = model_handler.artifact_format
+            print(f"{name:>10} {'per file':>12} {audio_seconds / per_file_time:>11.1f}")
+            print(f"{name:>10} {'packed':>12} {audio_seconds / packed_time:>11.1f} {check:>10}")
+            print(f"{name:>10} {'one signal':>12} {audio_seconds / joined_time:>11.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Scaling of parallel inference on one long file across worker threads
+
+Run from the repository root:
+    python benchmarks/parallel_bench.py [--seconds 300] [--max-workers 8]
+
+For every inference format the same noise signal is denoised with 1..N
+worker threads. Each TensorFlow op uses --intra-op threads (1 by default),
+so the speedup comes from running batches side by side. The output of
+every run is checked against the single-worker result.
+"""
+import argparse
+import os
+import sys
+import time
+
+os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audio_processor import AudioProcessor
+from model_handler import ModelHandler, configure_threads
+from setup import Setup
+
+def best_time(function, repeats):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default=Setup.MODEL_PATH)
+    parser.add_argument("--seconds", type=float, default=300.0, help="Length of the test signal")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--intra-op", type=int, default=1, help="TensorFlow threads per op")
+    parser.add_argument("--inter-op", type=int, default=None, help="TensorFlow ops run at once")
+    parser.add_argument("--formats", nargs="+", default=["keras", "tflite"],
+                        choices=["keras", "savedmodel", "tflite"])
+    parser.add_argument("--repeats", type=int, default=2)
+    args = parser.parse_args(argv)
+
+    # Thread pools must be sized before TensorFlow runs its first op
+    configure_threads(args.intra_op, args.inter_op or args.max_workers)
+
+    audio_processor = AudioProcessor()
+    samples = np.random.default_rng(0).uniform(-0.5, 0.5, int(Setup.SAMPLE_RATE * args.seconds))
+    chunks = audio_processor.chunk_audio(samples.astype(np.float32), Setup.BATCH_SIZE)
+
+    print(f"{len(chunks)} chunks, {os.cpu_count()} CPUs, intra-op threads {args.intra_op}")
+    print(f"{'format':>10} {'workers':>8} {'x realtime':>11} {'speedup':>8} {'output':>10}")
+    for artifact_format in args.formats:
+        reference = baseline = None
+        for workers in range(1, args.max_workers + 1):
+            model_handler = ModelHandler(args.model, audio_processor,
+                                         artifact_format=artifact_format, workers=workers)
+            elapsed, output = best_time(lambda: model_handler.infer_chunks(chunks), args.repeats)
+            if reference is None:
+                reference, baseline = output, elapsed
+            check = "identical" if np.array_equal(output, reference) else \
+                f"{np.abs(output - reference).max():.1e}"
+            print(f"{model_handler.artifact_format:>10} {workers:>8} {args.seconds / elapsed:>11.1f} "
+                  f"{baseline / elapsed:>8.2f} {check:>10}")
+
+if __name__ == "__main__":
+    main()
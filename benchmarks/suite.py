@@ -0,0 +1,218 @@
+"""Pipeline benchmark suite with a real-time-factor regression check
+
+Run from the repository root:
+    python benchmarks/suite.py [--output results.json] [--baseline baseline.json]
+
+Every stage of the offline pipeline (decode, resample, chunking, Keras
+and TFLite inference, each AudioFilters stage and save) is timed on the
+bundled test/*.wav files and on copies lengthened to --lengths seconds.
+Results hold throughput, real-time factor (stage time / audio duration)
+and the peak RSS of the process after the stage. With --baseline, stages
+slower than the baseline by more than --tolerance are reported and the
+script exits with status 1.
+
+Without the downloaded model (or with --tiny-model) a small stand-in
+Keras model with the same input shape is built, so the suite runs with
+no network access.
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from audio_processor import AudioProcessor
+from filter_chain import DEFAULT_ORDER, FilterStage
+from lazy_imports import lazy_import
+from resampler import resample
+from setup import Setup
+
+# Differences below this many seconds are timer noise, not regressions
+MIN_DIFFERENCE = 0.002
+
+tf = lazy_import("tensorflow")
+sf = lazy_import("soundfile")
+
+def build_tiny_model(path, batching_size=Setup.BATCH_SIZE):
+    """Save a small Keras model with the denoiser's input and output shape"""
+    tf.keras.utils.set_random_seed(0)
+    inputs = tf.keras.Input(shape=(batching_size, 1))
+    x = tf.keras.layers.Conv1D(8, 9, padding='same', activation='tanh')(inputs)
+    outputs = tf.keras.layers.Conv1D(1, 9, padding='same')(x)
+    tf.keras.Model(inputs, outputs).save(path)
+    return path
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def best_time(function, repeats):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def lengthen(path, seconds, directory):
+    """Write a copy of a WAV file repeated to `seconds` long"""
+    samples, sample_rate = sf.read(path, dtype='float32', always_2d=True)
+    repeats = int(np.ceil(seconds * sample_rate / len(samples)))
+    lengthened = np.tile(samples, (repeats, 1))[:int(seconds * sample_rate)]
+    name = f"{os.path.splitext(os.path.basename(path))[0]}_x{int(seconds)}s.wav"
+    output_path = os.path.join(directory, name)
+    sf.write(output_path, lengthened, sample_rate, subtype='PCM_16')
+    return output_path
+
+def benchmark_file(path, handlers, repeats, directory):
+    """Time every pipeline stage on one file and return the result records"""
+    audio_processor = AudioProcessor()
+    records = []
+
+    def record(stage, function, audio_seconds, stage_repeats=repeats):
+        elapsed, result = best_time(function, stage_repeats)
+        records.append({
+            'input': os.path.basename(path),
+            'stage': stage,
+            'audio_seconds': audio_seconds,
+            'seconds': elapsed,
+            'x_realtime': audio_seconds / elapsed if elapsed else None,
+            'rtf': elapsed / audio_seconds,
+            'peak_rss_mb': peak_rss_mb(),
+        })
+        return result
+
+    def decode():
+        audio, sample_rate = tf.audio.decode_wav(tf.io.read_file(path), desired_channels=1)
+        return audio.numpy().squeeze(), int(sample_rate.numpy())
+
+    duration = sf.info(path).duration
+    samples, sample_rate = record('decode', decode, duration)
+    samples = record('resample', lambda: resample(
+        samples, sample_rate, audio_processor.target_sample_rate, audio_processor.resample_quality), duration)
+    chunks = record('chunk', lambda: audio_processor.chunk_audio(samples, Setup.BATCH_SIZE), duration)
+
+    predicted = None
+    for name, model_handler in handlers.items():
+        output = record(name, lambda: model_handler.infer_chunks(chunks), duration)
+        predicted = output if predicted is None else predicted
+    predicted = predicted.reshape(-1)[:len(samples)]
+
+    sr = audio_processor.target_sample_rate
+    for name in DEFAULT_ORDER:
+        stage = FilterStage(name)
+        # Warm up imports and caches on one second, then a single timed run is enough
+        stage(predicted[:sr], sr)
+        record(f"filter:{name}", lambda: stage(predicted, sr), duration, stage_repeats=1)
+
+    output_path = os.path.join(directory, "output.wav")
+    record('save', lambda: audio_processor.save_audio(predicted, output_path), duration)
+    return records
+
+def compare(results, baseline, tolerance):
+    """Print per-stage ratios against a baseline and return the regressions"""
+    previous = {(r['input'], r['stage']): r for r in baseline['results']}
+    regressions = []
+    print(f"\n{'input':>16} {'stage':>28} {'baseline s':>11} {'now s':>9} {'ratio':>7}")
+    for r in results['results']:
+        old = previous.get((r['input'], r['stage']))
+        if old is None:
+            continue
+        ratio = r['seconds'] / old['seconds'] if old['seconds'] else float('inf')
+        flag = ""
+        if ratio > 1 + tolerance and r['seconds'] - old['seconds'] > MIN_DIFFERENCE:
+            flag = "  SLOWER"
+            regressions.append((r['input'], r['stage'], ratio))
+        print(f"{r['input']:>16} {r['stage']:>28} {old['seconds']:>11.4f} {r['seconds']:>9.4f} "
+              f"{ratio:>7.2f}{flag}")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default=Setup.MODEL_PATH, help="Keras model path")
+    parser.add_argument("--tiny-model", action="store_true",
+                        help="Use a small stand-in model even if the real one exists")
+    parser.add_argument("--inputs", nargs="+", default=sorted(glob.glob(os.path.join(ROOT, "test", "*.wav"))))
+    parser.add_argument("--lengths", nargs="*", type=float, default=[60.0, 600.0],
+                        help="Also benchmark the first input lengthened to these many seconds")
+    parser.add_argument("--formats", nargs="+", default=["keras", "tflite"], choices=["keras", "savedmodel", "tflite"])
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Compare against results from an earlier run")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed slowdown against the baseline, 0.2 means 20%%")
+    args = parser.parse_args(argv)
+
+    from model_handler import ModelHandler
+
+    with tempfile.TemporaryDirectory(prefix="nocle-bench-") as directory:
+        model_path = args.model
+        tiny = args.tiny_model or not os.path.exists(model_path)
+        if tiny:
+            print(f"Using a stand-in model{'' if args.tiny_model else f', {model_path} not found'}")
+            model_path = build_tiny_model(os.path.join(directory, "tiny.hdf5"))
+
+        audio_processor = AudioProcessor()
+        handlers = {
+            artifact_format: ModelHandler(model_path, audio_processor, artifact_format=artifact_format)
+            for artifact_format in args.formats
+        }
+        inputs = list(args.inputs)
+        if inputs:
+            inputs += [lengthen(inputs[0], seconds, directory) for seconds in args.lengths]
+
+        records = []
+        for path in inputs:
+            file_records = benchmark_file(path, handlers, args.repeats, directory)
+            for r in file_records:
+                print(f"{r['input']:>16} {r['stage']:>28} {r['seconds']:>9.4f} s "
+                      f"{r['x_realtime']:>10.1f}x realtime  RTF {r['rtf']:.5f}  "
+                      f"peak RSS {r['peak_rss_mb']:.0f} MB")
+            records += file_records
+
+    results = {
+        'meta': {
+            'created': time.strftime("%Y-%m-%dT%H:%M:%S"),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'tensorflow': tf.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'model': 'tiny' if tiny else os.path.basename(args.model),
+            'peak_rss_mb': peak_rss_mb(),
+        },
+        'results': records,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline['meta'].get('model') != results['meta']['model']:
+            print(f"⚠️ Baseline used model {baseline['meta'].get('model')}, this run used {results['meta']['model']}")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"❌ {len(regressions)} stages slower than the baseline by more than {args.tolerance:.0%}")
+            return 1
+        print("✅ No regressions against the baseline")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,332 @@
+import os
+os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')  # Suppress TensorFlow logging
+
+import argparse
+import glob
+import multiprocessing
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from setup import Setup
+from filter_chain import FilterChain
+from instrumentation import Tracer, activate, profiling, span, tracing
+
+_worker = None
+
+def _glob_root(pattern):
+    """Leading directories of a glob pattern that contain no wildcards"""
+    root = os.path.dirname(pattern)
+    while glob.has_magic(root):
+        root = os.path.dirname(root)
+    return root
+
+def find_inputs(patterns):
+    """Expand files, directories and glob patterns into sorted (path, root) pairs
+
+    root is the directory the path was found under, outputs keep the
+    path relative to it so files from different folders don't collide.
+    """
+    roots = {}
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            paths = glob.glob(os.path.join(pattern, "*.wav")) + glob.glob(os.path.join(pattern, "*.WAV"))
+            root = pattern
+        elif os.path.isfile(pattern):
+            paths = [pattern]
+            root = os.path.dirname(pattern)
+        else:
+            paths = glob.glob(pattern, recursive=True)
+            root = _glob_root(pattern)
+        for path in paths:
+            roots.setdefault(path, root)
+    return sorted(roots.items())
+
+def output_path_for(input_path, output_dir, root=None):
+    """Map an input file to its denoised output path, keeping its path below root"""
+    if root is None:
+        return os.path.join(output_dir, os.path.basename(input_path))
+    return os.path.join(output_dir, os.path.relpath(input_path, root or os.curdir))
+
+def _init_worker(options, threads_per_worker):
+    """Load the model once per worker process"""
+    global _worker
+    from audio_processor import AudioProcessor
+    from model_handler import ModelHandler
+    from result_cache import ResultCache
+
+    intra_op, inter_op = options['intra_op_threads'], options['inter_op_threads']
+    if threads_per_worker:
+        # Split the cores between worker processes unless set explicitly
+        intra_op = intra_op or threads_per_worker
+        inter_op = inter_op or 1
+
+    audio_processor = AudioProcessor(keep_channels=options['keep_channels'])
+    model_handler = ModelHandler(
+        options['model'],
+        audio_processor,
+        options['batch_size'],
+        artifact_format=options['artifact'],
+        quantization=options['quantization'],
+        workers=options['inference_workers'],
+        intra_op_threads=intra_op,
+        inter_op_threads=inter_op
+    )
+    result_cache = ResultCache(options['cache_dir']) if options['cache_dir'] else None
+    tracer = None
+    if options['trace'] and threads_per_worker:
+        # Records are sent back to the main process with every result
+        tracer = Tracer()
+        activate(tracer)
+    _worker = (model_handler, options, result_cache, tracer)
+
+def _denoise_file(input_path, output_path):
+    """Denoise one file into output_path
+
+    Returns (audio seconds, elapsed seconds, trace records), the records are
+    None unless a worker process is tracing.
+    """
+    model_handler, options, result_cache, tracer = _worker
+    start = time.perf_counter()
+    with span("file", input=os.path.basename(input_path)):
+        samples = _denoise(model_handler, options, result_cache, input_path, output_path)
+    elapsed = time.perf_counter() - start
+    records = tracer.drain() if tracer is not None else None
+    return samples / model_handler.audio_processor.target_sample_rate, elapsed, records
+
+def _denoise(model_handler, options, result_cache, input_path, output_path):
+    """Write the denoised file and return its length in samples"""
+    # Write to a temporary name so an interrupted run never leaves a partial output behind
+    partial_path = os.path.join(os.path.dirname(output_path), "." + os.path.basename(output_path) + ".part")
+
+    try:
+        samples = _write_output(model_handler, options, result_cache, input_path, partial_path)
+    except BaseException:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+
+    os.replace(partial_path, output_path)
+    return samples
+
+def _write_output(model_handler, options, result_cache, input_path, partial_path):
+    """Denoise input_path into partial_path and return its length in samples"""
+    from streaming import StreamingDenoiser
+
+    audio_processor = model_handler.audio_processor
+    if options['stream']:
+        samples = StreamingDenoiser(model_handler).process(input_path, partial_path)
+    elif options['mapped']:
+        from mapped_storage import MappedPipeline
+        filter_chain = FilterChain.from_config(options['filters'] or [])
+        samples = MappedPipeline(model_handler, filter_chain, dtype=options['mapped_dtype'],
+                                 directory=options['mapped_dir']).process(input_path, partial_path)
+    else:
+        audio = audio_processor.load(input_path)
+        filter_chain = FilterChain.from_config(options['filters'] or [])
+        if result_cache is not None:
+            predicted_audio = result_cache.denoise(
+                model_handler, audio, filter_chain,
+                overlap=options['overlap'], tflite_model_path=options['tflite'])
+        else:
+            if options['tflite']:
+                predicted_audio = model_handler.predict_tflite(audio, options['tflite'])
+            else:
+                predicted_audio = model_handler.predict(audio, overlap=options['overlap'])
+            predicted_audio = filter_chain.apply(predicted_audio, audio.sample_rate)
+        audio_processor.save_audio(predicted_audio, partial_path)
+        samples = predicted_audio.shape[-1]
+    return samples
+
+def run(jobs, options, workers):
+    """Denoise (input, output) jobs and yield (index, input, result or exception)"""
+    if workers == 1:
+        _init_worker(options, None)
+        for index, (input_path, output_path) in enumerate(jobs):
+            try:
+                yield index, input_path, _denoise_file(input_path, output_path)
+            except Exception as e:
+                yield index, input_path, e
+        return
+
+    threads_per_worker = max(1, (os.cpu_count() or 1) // workers)
+    # TensorFlow is not fork-safe, start clean interpreters instead
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker,
+                             initargs=(options, threads_per_worker)) as executor:
+        futures = {
+            executor.submit(_denoise_file, input_path, output_path): (index, input_path)
+            for index, (input_path, output_path) in enumerate(jobs)
+        }
+        for future in as_completed(futures):
+            index, input_path = futures[future]
+            try:
+                yield index, input_path, future.result()
+            except Exception as e:
+                yield index, input_path, e
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="nocle",
+        description="Denoise WAV files without the GUI"
+    )
+    parser.add_argument("inputs", nargs="+", help="WAV files, directories or glob patterns")
+    parser.add_argument("-o", "--output-dir", required=True, help="Directory for denoised files")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1,
+                        help="Worker processes, each loads the model once (default: CPU count)")
+    parser.add_argument("--model", default=Setup.MODEL_PATH, help="Keras model path")
+    parser.add_argument("--artifact", choices=["keras", "savedmodel", "tflite"],
+                        default=Setup.MODEL_ARTIFACT_FORMAT,
+                        help="Cached inference format converted from the Keras model")
+    parser.add_argument("--quantization", choices=["float16", "dynamic"],
+                        default=Setup.MODEL_QUANTIZATION, help="TFLite artifact quantization")
+    parser.add_argument("--tflite", help="Run inference with this TFLite model instead")
+    parser.add_argument("--batch-size", type=int, default=Setup.INFERENCE_BATCH_SIZE,
+                        help="Chunks per forward pass (default: picked from available memory)")
+    parser.add_argument("--inference-workers", type=int, default=Setup.INFERENCE_WORKERS,
+                        help="Threads running batches of each file in parallel")
+    parser.add_argument("--intra-op-threads", type=int, default=Setup.TF_INTRA_OP_THREADS,
+                        help="TensorFlow threads inside one op")
+    parser.add_argument("--inter-op-threads", type=int, default=Setup.TF_INTER_OP_THREADS,
+                        help="TensorFlow ops run at once")
+    parser.add_argument("--overlap", type=int, default=Setup.OVERLAP_SIZE,
+                        help="Samples shared by neighbouring chunks")
+    parser.add_argument("--filters", action="store_true", help="Apply all post-filters")
+    parser.add_argument("--filter-config", help="JSON file listing the post-filters to apply, in order")
+    parser.add_argument("--stream", action="store_true",
+                        help="Process files block by block with bounded memory")
+    parser.add_argument("--keep-channels", action="store_true",
+                        help="Denoise every channel of multi-channel files instead of only the first")
+    parser.add_argument("--mapped", action="store_true",
+                        help="Keep intermediate signals in memory-mapped files, memory stays bounded with filters too")
+    parser.add_argument("--mapped-dtype", choices=["int16", "float16", "float32"], default=Setup.MAPPED_DTYPE,
+                        help="Sample format of the intermediate files")
+    parser.add_argument("--mapped-dir", default=Setup.MAPPED_DIR,
+                        help="Directory for the intermediate files (default: system temp directory)")
+    parser.add_argument("--cache-dir", default=Setup.RESULT_CACHE_DIR,
+                        help="Reuse model and filter outputs cached here across runs")
+    parser.add_argument("--no-cache", action="store_true", help="Don't read or write the result cache")
+    parser.add_argument("--overwrite", action="store_true",
+                        help="Reprocess files whose output already exists")
+    parser.add_argument("--trace", metavar="FILE",
+                        help="Write per-stage timings in Chrome trace-event format (chrome://tracing, Perfetto)")
+    parser.add_argument("--trace-summary", metavar="FILE",
+                        help="Write per-stage totals, counters and peak memory as JSON")
+    parser.add_argument("--profile", metavar="FILE",
+                        help="cProfile the run into FILE, files are then processed in this process")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.stream and (args.filters or args.filter_config or args.tflite or args.overlap):
+        print("❌ --stream can't be combined with --filters, --filter-config, --tflite or --overlap")
+        return 2
+    if args.mapped and (args.stream or args.tflite or args.overlap):
+        print("❌ --mapped can't be combined with --stream, --tflite or --overlap")
+        return 2
+    if args.keep_channels and (args.stream or args.mapped):
+        print("❌ --keep-channels can't be combined with --stream or --mapped")
+        return 2
+
+    filter_config = None
+    if args.filter_config:
+        try:
+            filter_config = FilterChain.load(args.filter_config).to_config()
+        except (OSError, ValueError, KeyError) as e:
+            print(f"❌ Invalid filter config: {e}")
+            return 2
+    elif args.filters:
+        filter_config = FilterChain.default().to_config()
+
+    inputs = find_inputs(args.inputs)
+    if not inputs:
+        print("❌ No WAV files found")
+        return 1
+
+    sources = {}
+    for input_path, root in inputs:
+        sources.setdefault(output_path_for(input_path, args.output_dir, root), []).append(input_path)
+    duplicates = {output_path: paths for output_path, paths in sources.items() if len(paths) > 1}
+    if duplicates:
+        for output_path, paths in sorted(duplicates.items()):
+            print(f"❌ {', '.join(paths)} would all be written to {output_path}")
+        return 2
+
+    jobs = []
+    skipped = 0
+    for output_path, (input_path,) in sources.items():
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        if not args.overwrite and os.path.exists(output_path):
+            skipped += 1
+        else:
+            jobs.append((input_path, output_path))
+
+    if not jobs:
+        print(f"Nothing to do, all {skipped} outputs already exist")
+        return 0
+
+    options = {
+        'model': args.model,
+        'artifact': args.artifact,
+        'quantization': args.quantization,
+        'tflite': args.tflite,
+        'batch_size': args.batch_size,
+        'inference_workers': args.inference_workers,
+        'intra_op_threads': args.intra_op_threads,
+        'inter_op_threads': args.inter_op_threads,
+        'overlap': args.overlap,
+        'filters': filter_config,
+        'stream': args.stream,
+        'keep_channels': args.keep_channels,
+        'mapped': args.mapped,
+        'mapped_dtype': args.mapped_dtype,
+        'mapped_dir': args.mapped_dir,
+        'cache_dir': None if args.no_cache else args.cache_dir,
+        'trace': bool(args.trace or args.trace_summary),
+    }
+    workers = max(1, min(args.workers, len(jobs)))
+    if args.profile and workers > 1:
+        # cProfile only sees the calling thread of this process
+        print("⚠️ --profile processes all files in this process")
+        workers = 1
+    print(f"Processing {len(jobs)} files with {workers} workers, {skipped} already done")
+
+    tracer = Tracer() if options['trace'] else None
+    start = time.perf_counter()
+    audio_seconds = 0.0
+    failed = 0
+    with tracing(tracer), profiling(args.profile):
+        for done, (index, input_path, result) in enumerate(run(jobs, options, workers), 1):
+            name = os.path.basename(input_path)
+            if isinstance(result, Exception):
+                failed += 1
+                print(f"[{done}/{len(jobs)}] ❌ {name}: {result}")
+                continue
+            duration, elapsed, records = result
+            if records is not None:
+                tracer.merge(records)
+            audio_seconds += duration
+            print(f"[{done}/{len(jobs)}] ✅ {name}: {Setup.format_time(duration)} audio "
+                  f"in {elapsed:.2f}s (RTF {elapsed / max(duration, 1e-9):.3f})")
+
+    wall_time = time.perf_counter() - start
+    processed = len(jobs) - failed
+    print(f"Done: {processed} processed, {skipped} skipped, {failed} failed")
+    if audio_seconds:
+        print(f"Audio: {audio_seconds:.1f}s in {wall_time:.1f}s wall time, "
+              f"RTF {wall_time / audio_seconds:.4f} ({audio_seconds / wall_time:.1f}x real time)")
+
+    if tracer is not None:
+        print(tracer.format_summary())
+        if args.trace:
+            tracer.write_chrome_trace(args.trace)
+            print(f"Trace written to {args.trace}")
+        if args.trace_summary:
+            tracer.write_summary(args.trace_summary)
+            print(f"Trace summary written to {args.trace_summary}")
+    if args.profile:
+        print(f"Profile written to {args.profile}, view it with: python -m pstats {args.profile}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+import json
+
+from setup import Setup
+from filters import AudioFilters
+from instrumentation import span
+
+# Filter stages by name: each takes (audio, sr, **params) and returns the filtered audio
+STAGES = {
+    'spectral_gating': lambda audio, sr, **params: AudioFilters.spectral_gating(audio, sr, **params),
+    'wiener_filter': lambda audio, sr, **params: AudioFilters.wiener_filter(audio, **params),
+    'gaussian_blur': lambda audio, sr, **params: AudioFilters.gaussian_blur(audio, **params),
+    'noise_gate': lambda audio, sr, **params: AudioFilters.noise_gate(audio, **params),
+    'dynamic_expansion': lambda audio, sr, **params: AudioFilters.dynamic_expansion(audio, **params),
+    'exponential_smooth': lambda audio, sr, **params: AudioFilters.exponential_smooth(audio, **params),
+}
+
+# Order of apply_all_filters
+DEFAULT_ORDER = (
+    'spectral_gating',
+    'wiener_filter',
+    'gaussian_blur',
+    'noise_gate',
+    'dynamic_expansion',
+    'exponential_smooth',
+)
+
+class FilterStage:
+    """One named filter with its parameters"""
+    def __init__(self, name, **params):
+        if name not in STAGES:
+            raise ValueError(f"Unknown filter stage: {name}")
+        self.name = name
+        self.params = params
+
+    def __call__(self, audio, sr):
+        return STAGES[self.name](audio, sr, **self.params)
+
+    def to_dict(self):
+        return {'name': self.name, **self.params}
+
+    def __repr__(self):
+        params = ", ".join(f"{key}={value!r}" for key, value in self.params.items())
+        return f"FilterStage({self.name!r}{', ' + params if params else ''})"
+
+class FusedGateExpansion:
+    """Adjacent noise_gate and dynamic_expansion stages run as one pass"""
+    name = 'noise_gate+dynamic_expansion'
+
+    def __init__(self, gate, expansion):
+        self.gate_threshold = gate.params.get('threshold', Setup.NOISE_GATE_THRESHOLD)
+        self.expansion_params = expansion.params
+
+    def __call__(self, audio, sr):
+        return AudioFilters.gate_and_expand(audio, self.gate_threshold, **self.expansion_params)
+
+class FilterChain:
+    """Ordered list of filter stages, only the stages listed are run
+
+    A chain is built from GUI selections or a config, either a list of
+    {"name": ..., <params>} entries or {"filters": [...]} in a JSON file.
+    """
+    def __init__(self, stages=()):
+        self.stages = list(stages)
+
+    @classmethod
+    def from_config(cls, config):
+        """Build a chain from a list of stage dicts or a {"filters": [...]} mapping"""
+        if isinstance(config, dict):
+            config = config.get('filters', [])
+        stages = []
+        for entry in config:
+            if isinstance(entry, str):
+                entry = {'name': entry}
+            params = dict(entry)
+            stages.append(FilterStage(params.pop('name'), **params))
+        return cls(stages)
+
+    @classmethod
+    def load(cls, path):
+        """Read a chain from a JSON config file"""
+        with open(path) as f:
+            return cls.from_config(json.load(f))
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump({'filters': self.to_config()}, f, indent=2)
+
+    def to_config(self):
+        return [stage.to_dict() for stage in self.stages]
+
+    @classmethod
+    def default(cls, params=None):
+        """The full chain apply_all_filters runs, with optional GUI parameters"""
+        return cls.from_selection(True, True, True, params, dynamics=True)
+
+    @classmethod
+    def from_selection(cls, spectral_gate=False, wiener=False, gaussian=False, params=None,
+                       dynamics=False):
+        """Chain of the selected filters in the default order
+
+        params may hold 'wiener_size' and 'gaussian_sigma'. dynamics adds the
+        noise gate, dynamic expansion and exponential smoothing stages.
+        """
+        params = params or {}
+        stages = []
+        if spectral_gate:
+            stages.append(FilterStage('spectral_gating'))
+        if wiener:
+            stages.append(FilterStage('wiener_filter',
+                                      mysize=params.get('wiener_size', Setup.WIENER_FILTER_SIZE)))
+        if gaussian:
+            stages.append(FilterStage('gaussian_blur',
+                                      sigma=params.get('gaussian_sigma', Setup.GAUSSIAN_BLUR_SIGMA)))
+        if dynamics:
+            stages += [FilterStage(name) for name in DEFAULT_ORDER[3:]]
+        return cls(stages)
+
+    def __len__(self):
+        return len(self.stages)
+
+    def __repr__(self):
+        return f"FilterChain({self.stages!r})"
+
+    def compile(self):
+        """Callables to run in order, with adjacent gate and expansion stages fused"""
+        steps = []
+        i = 0
+        while i < len(self.stages):
+            stage = self.stages[i]
+            following = self.stages[i + 1] if i + 1 < len(self.stages) else None
+            if stage.name == 'noise_gate' and following is not None and following.name == 'dynamic_expansion':
+                steps.append(FusedGateExpansion(stage, following))
+                i += 2
+            else:
+                steps.append(stage)
+                i += 1
+        return steps
+
+    def apply(self, audio, sr=Setup.SAMPLE_RATE):
+        """Run the chain on audio, an empty chain returns it unchanged"""
+        for step in self.compile():
+            with span(f"filter:{step.name}"):
+                audio = step(audio, sr)
+        return audio
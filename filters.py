@@ -1,68 +1,115 @@
 import numpy as np
-import librosa
-from scipy.signal import wiener
-from scipy.ndimage import gaussian_filter1d
 
 from setup import Setup
+from lazy_imports import lazy_import
+from spectral import Spectrogram
+
+signal = lazy_import("scipy.signal")
+ndimage = lazy_import("scipy.ndimage")
 
 class AudioFilters:
+    """Post-filters for mono or (channels, samples) audio, working along the last axis
+
+    Dynamic expansion normalises by the peak over all channels, so the
+    balance between channels is kept.
+    """
     @staticmethod
     def noise_gate(data, threshold=Setup.NOISE_GATE_THRESHOLD):
         """Apply noise gate filter"""
         return np.where(np.abs(data) > threshold, data, 0)
 
     @staticmethod
-    def dynamic_expansion(data, threshold=Setup.DYNAMIC_EXPANSION_THRESHOLD, ratio=Setup.DYNAMIC_EXPANSION_RATIO):
-        """Apply dynamic expansion"""
+    def dynamic_expansion(data, threshold=Setup.DYNAMIC_EXPANSION_THRESHOLD, ratio=Setup.DYNAMIC_EXPANSION_RATIO,
+                          normalize=True):
+        """Apply dynamic expansion
+
+        normalize=False skips scaling the peak to one, for callers that
+        expand a signal block by block and normalise it afterwards.
+        """
         expanded = np.where(
             np.abs(data) > threshold,
             np.sign(data) * (np.abs(data) ** ratio),
             data
         )
+        if not normalize:
+            return expanded
         return expanded / np.max(np.abs(expanded))
 
+    @staticmethod
+    def gate_and_expand(data, gate_threshold=Setup.NOISE_GATE_THRESHOLD,
+                        threshold=Setup.DYNAMIC_EXPANSION_THRESHOLD, ratio=Setup.DYNAMIC_EXPANSION_RATIO,
+                        normalize=True):
+        """Apply noise gate then dynamic expansion in one pass
+
+        Same result as dynamic_expansion(noise_gate(data)), computing the
+        magnitude once and expanding in place instead of building
+        intermediate arrays for every step.
+        """
+        magnitude = np.abs(data)
+        output = np.where(magnitude > gate_threshold, data, 0)
+        # Gated samples are zero, so only samples above both thresholds expand
+        expand = magnitude > max(gate_threshold, threshold)
+        output[expand] = np.sign(data[expand]) * (magnitude[expand] ** ratio)
+        if not normalize:
+            return output
+        np.abs(output, out=magnitude)
+        output /= np.max(magnitude)
+        return output
+
     @staticmethod
     def exponential_smooth(data, alpha=Setup.EXPONENTIAL_SMOOTH_ALPHA):
         """Apply exponential smoothing"""
-        smoothed = np.zeros_like(data)
-        smoothed[0] = data[0]
-        for t in range(1, len(data)):
-            smoothed[t] = alpha * data[t] + (1 - alpha) * smoothed[t-1]
+        smoothed, _ = AudioFilters.exponential_smooth_chunk(data, alpha)
         return smoothed
 
     @staticmethod
-    def spectral_gating(noisy_signal, sr):
+    def exponential_smooth_chunk(data, alpha=Setup.EXPONENTIAL_SMOOTH_ALPHA, previous=None):
+        """Apply exponential smoothing to one chunk of a stream
+
+        `previous` is the last smoothed sample of the prior chunk, None starts
+        a new stream. Returns the smoothed chunk and the state for the next one.
+        """
+        smoothed = np.zeros_like(data)
+        if data.shape[-1] == 0:
+            return smoothed, previous
+
+        start = 0
+        if previous is None:
+            smoothed[..., 0] = previous = data[..., 0]
+            start = 1
+
+        # y[t] = alpha * x[t] + (1 - alpha) * y[t-1] as a first-order IIR filter,
+        # coefficients in the data dtype so rounding matches the per-sample loop
+        b = np.array([alpha], dtype=data.dtype)
+        a = np.array([1, alpha - 1], dtype=data.dtype)
+        zi = np.array([1 - alpha], dtype=data.dtype) * np.asarray(previous)[..., np.newaxis]
+        filtered, _ = signal.lfilter(b, a, data[..., start:], axis=-1, zi=zi)
+        smoothed[..., start:] = filtered
+        return smoothed, smoothed[..., -1].copy()
+
+    @staticmethod
+    def spectral_gating(noisy_signal, sr, threshold=Setup.SPECTRAL_GATE_THRESHOLD):
         """Apply spectral gating for noise reduction"""
-        stft = librosa.stft(noisy_signal, 
-                           n_fft=Setup.SPECTRAL_GATE_N_FFT, 
-                           hop_length=Setup.SPECTRAL_GATE_HOP_LENGTH)
-        magnitude, phase = np.abs(stft), np.angle(stft)
-        
-        noise_thresh = np.median(magnitude, axis=1)[:, None]
-        mask = magnitude > (Setup.SPECTRAL_GATE_THRESHOLD * noise_thresh)
-        
-        filtered_stft = stft * mask
-        return librosa.istft(filtered_stft, hop_length=Setup.SPECTRAL_GATE_HOP_LENGTH)
+        return Spectrogram(noisy_signal, sr).gate(threshold).inverse()
 
     @staticmethod
     def wiener_filter(audio, mysize=Setup.WIENER_FILTER_SIZE, noise_var=Setup.WIENER_FILTER_NOISE_VAR):
         """Apply Wiener filter"""
-        return wiener(audio, mysize=mysize, noise=noise_var)
+        if np.ndim(audio) > 1:
+            # Filter along time only, channels stay independent
+            mysize = (1,) * (np.ndim(audio) - 1) + (mysize,)
+        return signal.wiener(audio, mysize=mysize, noise=noise_var)
 
     @staticmethod
     def gaussian_blur(audio, sigma=Setup.GAUSSIAN_BLUR_SIGMA):
         """Apply Gaussian blur"""
-        return gaussian_filter1d(audio, sigma=sigma)
+        return ndimage.gaussian_filter1d(audio, sigma=sigma)
 
     @classmethod
     def apply_all_filters(cls, audio, sr, params=None):
-        """Apply all filters in sequence"""
-        # Apply filters in sequence with parameters from Setup
-        audio = cls.spectral_gating(audio, sr)
-        audio = cls.wiener_filter(audio)
-        audio = cls.gaussian_blur(audio)
-        audio = cls.noise_gate(audio)
-        audio = cls.dynamic_expansion(audio)
-        audio = cls.exponential_smooth(audio)
-        
-        return audio
\ No newline at end of file
+        """Apply all filters in sequence
+
+        params may override 'wiener_size' and 'gaussian_sigma'.
+        """
+        from filter_chain import FilterChain
+        return FilterChain.default(params).apply(audio, sr)
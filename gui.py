@@ -1,19 +1,21 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import os
-import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.figure import Figure
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import librosa
-import sounddevice as sd
-import soundfile as sf
+import queue
 import threading
 import time
-import librosa.display
+from lazy_imports import lazy_import
 from audio_processor import AudioProcessor
-from model_handler import ModelHandler
-from filters import AudioFilters
+from filter_chain import FilterChain
+from instrumentation import Tracer, profiling, tracing
+from result_cache import ResultCache
+from setup import Setup
+from spectral import SpectrogramPyramid
+from spectrogram_plot import SpectrogramPlot
+
+# Heavy dependencies load on first use so the window appears quickly
+sd = lazy_import("sounddevice")
+sf = lazy_import("soundfile")
 
 class NocleGUI:
     def __init__(self, root):
@@ -25,8 +27,16 @@ class NocleGUI:
         self.audio_processor = AudioProcessor()
         self.model_handler = None
         self.current_audio_path = None
+        self.original_audio = None
         self.output_path = None
         self.processed_audio = None
+        # Repeated runs with the same settings reuse earlier model and filter outputs
+        self.result_cache = ResultCache()
+        # Spectrogram pyramids are built once per audio and reused on every redraw
+        self.original_spectrum = None
+        self.processed_spectrum = None
+        self.original_plot = None
+        self.processed_plot = None
         self.spectrogram_window = None
         self.fig_original = None
         self.fig_processed = None
@@ -44,6 +54,17 @@ class NocleGUI:
         self.current_frame = 0
         self.audio_data = None
         self.sample_rate = 16000
+
+        # Background processing
+        self.process_thread = None
+        self.process_queue = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.trace_prefix = None
+
+        # Live microphone denoising
+        self.live_session = None
+        self.live_thread = None
+        self.live_queue = queue.Queue()
         
         self._create_widgets()
         self._load_model()
@@ -73,10 +94,14 @@ class NocleGUI:
         self.use_gaussian = tk.BooleanVar(value=False)
         ttk.Checkbutton(filter_frame, text="Gaussian Blur", variable=self.use_gaussian).grid(row=0, column=2)
 
+        # Noise gate, dynamic expansion and exponential smoothing
+        self.use_dynamics = tk.BooleanVar(value=False)
+        ttk.Checkbutton(filter_frame, text="Dynamics", variable=self.use_dynamics).grid(row=0, column=3)
+
         # Show Spectrograms option
         self.show_spectrograms = tk.BooleanVar(value=False)
         ttk.Checkbutton(filter_frame, text="Show Spectrograms", 
-                       variable=self.show_spectrograms).grid(row=0, column=3)
+                       variable=self.show_spectrograms).grid(row=0, column=4)
 
         # Filter parameters
         param_frame = ttk.Frame(filter_frame)
@@ -92,8 +117,24 @@ class NocleGUI:
         self.gaussian_sigma.set(2.0)
         self.gaussian_sigma.grid(row=0, column=3, padx=5)
 
-        # Process button
-        ttk.Button(main_frame, text="Process Audio", command=self._process_audio).grid(row=2, column=0, columnspan=3, pady=10)
+        ttk.Label(param_frame, text="Chunk Overlap:").grid(row=0, column=4, padx=5)
+        self.overlap_size = ttk.Spinbox(param_frame, from_=0, to=6000, increment=500, width=6)
+        self.overlap_size.set(0)
+        self.overlap_size.grid(row=0, column=5, padx=5)
+
+        # Process and live buttons
+        button_frame = ttk.Frame(main_frame)
+        button_frame.grid(row=2, column=0, columnspan=3, pady=10)
+        self.process_button = ttk.Button(button_frame, text="Process Audio", command=self._process_audio)
+        self.process_button.grid(row=0, column=0, padx=5)
+        self.cancel_button = ttk.Button(button_frame, text="Cancel", command=self._cancel_processing,
+                                        state=tk.DISABLED)
+        self.cancel_button.grid(row=0, column=1, padx=5)
+        self.live_button = ttk.Button(button_frame, text="Live Denoise", command=self._toggle_live)
+        self.live_button.grid(row=0, column=2, padx=5)
+        # Per-stage timings, memory and a cProfile of the next runs go to Setup.TRACE_DIR
+        self.record_trace = tk.BooleanVar(value=False)
+        ttk.Checkbutton(button_frame, text="Record Trace", variable=self.record_trace).grid(row=0, column=3, padx=5)
 
         # Progress bar
         self.progress_var = tk.DoubleVar()
@@ -137,13 +178,32 @@ class NocleGUI:
         self.processed_time_label.grid(row=1, column=1)
 
     def _load_model(self):
-        try:
-            model_path = "model/nocle.hdf5"
-            self.model_handler = ModelHandler(model_path, self.audio_processor)
-            self.status_var.set("Model loaded successfully")
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to load model: {str(e)}")
+        """Load the model in the background so the window stays usable"""
+        self.model_error = None
+        self.status_var.set("Loading model...")
+
+        def load():
+            try:
+                # Importing ModelHandler pulls in TensorFlow
+                from model_handler import ModelHandler
+                model_path = "model/nocle.hdf5"
+                self.model_handler = ModelHandler(model_path, self.audio_processor)
+            except Exception as e:
+                self.model_error = e
+
+        self.model_thread = threading.Thread(target=load, daemon=True)
+        self.model_thread.start()
+        self.root.after(100, self._check_model_loaded)
+
+    def _check_model_loaded(self):
+        """Poll the model loading thread from the Tk loop"""
+        if self.model_thread.is_alive():
+            self.root.after(100, self._check_model_loaded)
+        elif self.model_error is not None:
+            messagebox.showerror("Error", f"Failed to load model: {str(self.model_error)}")
             self.root.quit()
+        else:
+            self.status_var.set("Model loaded successfully")
 
     def _browse_file(self):
         file_path = filedialog.askopenfilename(
@@ -156,87 +216,254 @@ class NocleGUI:
             # Show original audio controls
             self.playback_frame.grid()
             
-            # Calculate total duration and update display
-            audio_data = self.audio_processor.get_audio(self.current_audio_path)
-            total_duration = int(len(audio_data) / 16000)  # Sample rate is 16000
+            # Decode once, prediction and spectrograms reuse the result
+            self.original_audio = self.audio_processor.load(self.current_audio_path)
+            self.original_spectrum = None
+            total_duration = int(self.original_audio.duration)
             self.original_time_label.config(text=f"0 / {total_duration}")
 
     def _process_audio(self):
         if not self.current_audio_path:
             messagebox.showwarning("Warning", "Please select an audio file first")
             return
+        if self.model_handler is None:
+            messagebox.showwarning("Warning", "Model is still loading, please wait")
+            return
+        if self.process_thread is not None and self.process_thread.is_alive():
+            return
 
         try:
-            self.status_var.set("Processing audio...")
-            self.progress_var.set(20)
-            self.root.update()
-
-            # Get filter parameters
+            # Read the widgets here, the worker thread must not touch Tk
             filter_params = {
                 'wiener_size': int(self.wiener_size.get()),
                 'gaussian_sigma': float(self.gaussian_sigma.get())
             }
+            overlap = int(self.overlap_size.get())
+        except ValueError as e:
+            messagebox.showerror("Error", f"Invalid filter parameters: {str(e)}")
+            return
 
-            # Process audio
-            predicted_audio = self.model_handler.predict(self.current_audio_path)
-            self.progress_var.set(60)
-            self.root.update()
-
-            # Apply selected filters
-            if any([self.use_spectral_gate.get(), self.use_wiener.get(), self.use_gaussian.get()]):
-                predicted_audio = AudioFilters.apply_all_filters(
-                    predicted_audio,
-                    sr=16000,
-                    params=filter_params
+        # Only the selected filters are applied
+        filter_chain = FilterChain.from_selection(
+            spectral_gate=self.use_spectral_gate.get(),
+            wiener=self.use_wiener.get(),
+            gaussian=self.use_gaussian.get(),
+            params=filter_params,
+            dynamics=self.use_dynamics.get()
+        )
+
+        self.status_var.set("Processing audio...")
+        self.progress_var.set(0)
+        self.process_button.config(state=tk.DISABLED)
+        self.cancel_button.config(state=tk.NORMAL)
+
+        trace_prefix = None
+        if self.record_trace.get():
+            trace_prefix = os.path.join(Setup.TRACE_DIR, time.strftime("nocle-%Y%m%d-%H%M%S"))
+
+        self.cancel_event = threading.Event()
+        self.process_queue = queue.Queue()
+        self.process_thread = threading.Thread(
+            target=self._process_worker,
+            args=(self.original_audio, filter_chain, overlap, self.cancel_event, self.process_queue,
+                  trace_prefix),
+            name="nocle-process",
+            daemon=True
+        )
+        self.process_thread.start()
+        self.root.after(50, self._poll_processing)
+
+    def _process_worker(self, audio, filter_chain, overlap, cancel_event, messages, trace_prefix=None):
+        """Run the model and filters off the Tk thread and report back through a queue
+
+        With a trace_prefix, the run is traced and profiled into
+        <prefix>.trace.json, <prefix>.summary.json and <prefix>.prof.
+        """
+        from model_handler import ProcessingCancelled
+
+        def progress(done, total):
+            if cancel_event.is_set():
+                raise ProcessingCancelled()
+            messages.put(('progress', done / total))
+
+        tracer = None
+        if trace_prefix:
+            os.makedirs(os.path.dirname(trace_prefix), exist_ok=True)
+            tracer = Tracer()
+        try:
+            with tracing(tracer), profiling(trace_prefix and trace_prefix + ".prof"):
+                # Model and filter outputs come from the cache when unchanged
+                predicted_audio = self.result_cache.denoise(
+                    self.model_handler,
+                    audio,
+                    filter_chain,
+                    overlap=overlap,
+                    progress=progress
                 )
+            if cancel_event.is_set():
+                raise ProcessingCancelled()
+            if tracer is not None:
+                tracer.write_chrome_trace(trace_prefix + ".trace.json")
+                tracer.write_summary(trace_prefix + ".summary.json")
+                messages.put(('trace', trace_prefix))
+            messages.put(('done', predicted_audio))
+        except ProcessingCancelled:
+            messages.put(('cancelled', None))
+        except Exception as e:
+            messages.put(('error', e))
 
-            self.progress_var.set(80)
-            self.root.update()
+    def _poll_processing(self):
+        """Apply worker updates on the Tk thread"""
+        while True:
+            try:
+                kind, value = self.process_queue.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'progress':
+                # Inference takes most of the time, filtering finishes the bar
+                self.progress_var.set(90 * value)
+                if value < 1:
+                    self.status_var.set(f"Processing audio... {int(100 * value)}%")
+                else:
+                    self.status_var.set("Applying filters...")
+            elif kind == 'trace':
+                self.trace_prefix = value
+            else:
+                self._finish_processing(kind, value)
+                return
+        self.root.after(50, self._poll_processing)
+
+    def _cancel_processing(self):
+        """Ask the worker to stop after the current model batch"""
+        self.cancel_event.set()
+        self.cancel_button.config(state=tk.DISABLED)
+        self.status_var.set("Cancelling...")
+
+    def _finish_processing(self, kind, value):
+        self.process_thread = None
+        self.process_button.config(state=tk.NORMAL)
+        self.cancel_button.config(state=tk.DISABLED)
+        self.progress_var.set(0)
+
+        if kind == 'cancelled':
+            self.status_var.set("Processing cancelled")
+            return
+        if kind == 'error':
+            messagebox.showerror("Error", f"Processing failed: {str(value)}")
+            self.status_var.set("Processing failed")
+            return
 
-            # Store processed audio and update UI
-            self.processed_audio = predicted_audio
-            
-            # Show processed audio controls
-            self.processed_frame.grid()
-            
-            # Update processed audio time label with total duration
-            total_duration = int(len(predicted_audio) / 16000)
-            self.processed_time_label.config(text=f"0 / {total_duration}")
-            
-            if self.show_spectrograms.get():
-                self._create_spectrogram_window()
+        # Store processed audio and update UI
+        self.processed_audio = value
+        self.processed_spectrum = None
 
-            # Show save button for processed audio
+        # Show processed audio controls
+        self.processed_frame.grid()
+
+        # Update processed audio time label with total duration
+        total_duration = int(len(value) / 16000)
+        self.processed_time_label.config(text=f"0 / {total_duration}")
+
+        if self.show_spectrograms.get():
+            self._update_processed_spectrogram()
+
+        # Add save button to processed frame if not already added
+        if not hasattr(self, 'save_button'):
+            self.save_button = ttk.Button(self.processed_frame, text="Save", command=self._save_processed_audio)
+            self.save_button.grid(row=0, column=3, padx=2)
+
+        if self.trace_prefix:
+            self.status_var.set(f"Processing completed successfully, trace saved to {self.trace_prefix}.*")
+            self.trace_prefix = None
+        else:
             self.status_var.set("Processing completed successfully")
-            
-            # Add save button to processed frame if not already added
-            if not hasattr(self, 'save_button'):
-                self.save_button = ttk.Button(self.processed_frame, text="Save", command=self._save_processed_audio)
-                self.save_button.grid(row=0, column=3, padx=2)
-            
-            self.progress_var.set(100)
 
+    def _toggle_live(self):
+        """Start or stop live microphone denoising"""
+        if self.live_session is not None:
+            self._stop_live()
+            return
+        if self.model_handler is None:
+            messagebox.showwarning("Warning", "Model is still loading, please wait")
+            return
+        if self.live_thread is not None and self.live_thread.is_alive():
+            return
+
+        self._stop_audio()
+        self.live_button.config(state=tk.DISABLED)
+        self.status_var.set("Measuring model speed for live denoising...")
+        self.live_queue = queue.Queue()
+        self.live_thread = threading.Thread(
+            target=self._live_worker,
+            args=(self.live_queue,),
+            name="nocle-live-setup",
+            daemon=True
+        )
+        self.live_thread.start()
+        self.root.after(50, self._poll_live_setup)
+
+    def _live_worker(self, messages):
+        """Time the model off the Tk thread to pick the live chunk size"""
+        from realtime import choose_chunk_size
+        try:
+            messages.put(('done', choose_chunk_size(self.model_handler)))
         except Exception as e:
-            messagebox.showerror("Error", f"Processing failed: {str(e)}")
-            self.status_var.set("Processing failed")
-        
-        finally:
-            self.progress_var.set(0)
-
-    def _plot_spectrogram(self, audio_data, ax, sr=16000):
-        """Plot spectrogram on the given axes"""
-        ax.clear()
-        D = librosa.amplitude_to_db(np.abs(librosa.stft(audio_data)), ref=np.max)
-        img = librosa.display.specshow(D, y_axis='log', x_axis='time', ax=ax)
-        ax.set_title('Spectrogram')
-        if ax == self.ax_original:
-            self.fig_original.colorbar(img, ax=ax, format="%+2.f dB")
-        else:
-            self.fig_processed.colorbar(img, ax=ax, format="%+2.f dB")
+            messages.put(('error', e))
+
+    def _poll_live_setup(self):
+        """Start the live session once the chunk size is chosen"""
+        try:
+            kind, value = self.live_queue.get_nowait()
+        except queue.Empty:
+            self.root.after(50, self._poll_live_setup)
+            return
+
+        from realtime import RealtimeDenoiser, LiveSession
+        self.live_button.config(state=tk.NORMAL)
+        try:
+            if kind == 'error':
+                raise value
+            chunk_size, overlap, _ = value
+            denoiser = RealtimeDenoiser(self.model_handler, chunk_size, overlap)
+            self.live_session = LiveSession(denoiser)
+            self.live_session.start()
+        except Exception as e:
+            self.live_session = None
+            self.status_var.set("Ready")
+            messagebox.showerror("Error", f"Live denoising failed: {str(e)}")
+            return
+
+        self.live_button.config(text="Stop Live")
+        self.status_var.set(f"Live denoising with {chunk_size} sample chunks")
+        self.root.after(1000, self._update_live_stats)
+
+    def _update_live_stats(self):
+        """Show measured latency and underruns while live denoising runs"""
+        if self.live_session is None:
+            return
+        stats = self.live_session.stats()
+        if stats['latency_mean'] is not None:
+            self.status_var.set(
+                f"Live: latency {stats['latency_mean'] * 1000:.0f} ms, "
+                f"underruns {stats['underruns']}"
+            )
+        self.root.after(1000, self._update_live_stats)
+
+    def _stop_live(self):
+        """Stop live microphone denoising"""
+        if self.live_session is not None:
+            self.live_session.stop()
+            self.live_session = None
+        self.live_button.config(text="Live Denoise")
+        self.status_var.set("Ready")
 
     def _create_spectrogram_window(self):
         """Create a new window for spectrograms"""
         if self.spectrogram_window is None or not self.spectrogram_window.winfo_exists():
+            # matplotlib is only needed once the spectrogram window opens
+            from matplotlib.figure import Figure
+            from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
+
             self.spectrogram_window = tk.Toplevel(self.root)
             self.spectrogram_window.title("Audio Spectrograms")
             self.spectrogram_window.geometry("1000x700")
@@ -246,13 +473,18 @@ class NocleGUI:
             self.ax_original = self.fig_original.add_subplot(111)
             self.canvas_original = FigureCanvasTkAgg(self.fig_original, master=self.spectrogram_window)
             self.canvas_original.get_tk_widget().pack(pady=10)
+            # Zoom and pan redraw only the visible region at a matching resolution
+            NavigationToolbar2Tk(self.canvas_original, self.spectrogram_window, pack_toolbar=False).pack()
             ttk.Label(self.spectrogram_window, text="Original Audio Spectrogram").pack()
+            self.original_plot = SpectrogramPlot(self.ax_original, self.root.after_idle)
 
             self.fig_processed = Figure(figsize=(8, 4))
             self.ax_processed = self.fig_processed.add_subplot(111)
             self.canvas_processed = FigureCanvasTkAgg(self.fig_processed, master=self.spectrogram_window)
             self.canvas_processed.get_tk_widget().pack(pady=10)
+            NavigationToolbar2Tk(self.canvas_processed, self.spectrogram_window, pack_toolbar=False).pack()
             ttk.Label(self.spectrogram_window, text="Processed Audio Spectrogram").pack()
+            self.processed_plot = SpectrogramPlot(self.ax_processed, self.root.after_idle)
 
             # Update original spectrogram if file is loaded
             if self.current_audio_path:
@@ -276,8 +508,10 @@ class NocleGUI:
         if self.current_audio_path and self.show_spectrograms.get():
             if self.spectrogram_window is None or not self.spectrogram_window.winfo_exists():
                 self._create_spectrogram_window()
-            audio_data = self.audio_processor.get_audio(self.current_audio_path)
-            self._plot_spectrogram(audio_data, self.ax_original)
+            if self.original_spectrum is None:
+                self.original_spectrum = SpectrogramPyramid(self.original_audio.samples,
+                                                            self.original_audio.sample_rate)
+            self.original_plot.show(self.original_spectrum)
             self.canvas_original.draw()
 
     def _update_processed_spectrogram(self):
@@ -285,7 +519,9 @@ class NocleGUI:
         if self.processed_audio is not None and self.show_spectrograms.get():
             if self.spectrogram_window is None or not self.spectrogram_window.winfo_exists():
                 self._create_spectrogram_window()
-            self._plot_spectrogram(self.processed_audio, self.ax_processed)
+            if self.processed_spectrum is None:
+                self.processed_spectrum = SpectrogramPyramid(self.processed_audio)
+            self.processed_plot.show(self.processed_spectrum)
             self.canvas_processed.draw()
 
     def _play_audio(self, audio_type):
@@ -443,6 +679,9 @@ class NocleGUI:
     def __del__(self):
         """Cleanup when the application closes"""
         self._stop_audio()  # Stop any playing audio
+        self.cancel_event.set()  # Stop background processing
+        if self.live_session is not None:
+            self.live_session.stop()
         # Remove temporary file if it exists
         if os.path.exists("temp_processed.wav"):
             try:
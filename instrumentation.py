@@ -0,0 +1,246 @@
+"""Per-stage timers, counters and memory samples for the processing pipeline
+
+Pipeline code marks its stages with span() and count(), which do nothing
+unless a Tracer is activated with tracing():
+
+    tracer = Tracer()
+    with tracing(tracer), profiling("run.prof"):
+        model_handler.predict(path)
+    tracer.write_summary("summary.json")
+    tracer.write_chrome_trace("trace.json")  # chrome://tracing or ui.perfetto.dev
+
+Spans from every thread are collected, so worker threads show up as their
+own tracks in the Chrome trace.
+"""
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+
+from setup import Setup
+
+_active = None
+_null_span = nullcontext()
+
+def current_rss():
+    """Resident set size of this process in bytes, or None if unknown"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # Only the peak is available here, kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+class Tracer:
+    """Collect timed spans, counters and memory samples from all threads"""
+    def __init__(self, memory_interval=Setup.TRACE_MEMORY_INTERVAL):
+        self.memory_interval = memory_interval
+        self.origin = time.perf_counter()
+        self.spans = []  # (name, pid, tid, start, duration, args)
+        self.counters = defaultdict(float)
+        self.memory = []  # (time, pid, rss bytes)
+        self.thread_names = {}  # (pid, tid) -> name
+        self._lock = threading.Lock()
+        self._stop = None
+        self._sampler = None
+
+    @contextmanager
+    def span(self, name, **args):
+        """Time the enclosed block as one occurrence of stage `name`"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            thread = threading.current_thread()
+            key = (os.getpid(), threading.get_native_id())
+            with self._lock:
+                self.spans.append((name, key[0], key[1], start, duration, args))
+                self.thread_names.setdefault(key, thread.name)
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] += value
+
+    def sample_memory(self):
+        rss = current_rss()
+        if rss is not None:
+            with self._lock:
+                self.memory.append((time.perf_counter(), os.getpid(), rss))
+
+    def start(self):
+        """Sample memory in the background until stop()"""
+        if self._sampler is not None:
+            return
+        self._stop = threading.Event()
+
+        def sample():
+            while not self._stop.wait(self.memory_interval):
+                self.sample_memory()
+
+        self.sample_memory()
+        self._sampler = threading.Thread(target=sample, name="trace-memory", daemon=True)
+        self._sampler.start()
+
+    def stop(self):
+        if self._sampler is None:
+            return
+        self._stop.set()
+        self._sampler.join()
+        self._sampler = None
+        self.sample_memory()
+
+    def drain(self):
+        """Return and forget everything recorded so far, for merge() in another process"""
+        with self._lock:
+            data = {
+                'spans': self.spans,
+                'counters': dict(self.counters),
+                'memory': self.memory,
+                'thread_names': list(self.thread_names.items()),
+            }
+            self.spans, self.memory = [], []
+            self.counters = defaultdict(float)
+        return data
+
+    def merge(self, data):
+        """Add records drained from a tracer in a worker process"""
+        with self._lock:
+            self.spans.extend(tuple(span) for span in data['spans'])
+            for name, value in data['counters'].items():
+                self.counters[name] += value
+            self.memory.extend(tuple(sample) for sample in data['memory'])
+            for key, name in data['thread_names']:
+                self.thread_names.setdefault(tuple(key), name)
+
+    def summary(self):
+        """Per-stage call counts and times, counters and peak memory"""
+        stages = {}
+        for name, _, _, _, duration, _ in self.spans:
+            stage = stages.setdefault(name, {'calls': 0, 'total_seconds': 0.0, 'max_seconds': 0.0})
+            stage['calls'] += 1
+            stage['total_seconds'] += duration
+            stage['max_seconds'] = max(stage['max_seconds'], duration)
+        for stage in stages.values():
+            stage['mean_seconds'] = stage['total_seconds'] / stage['calls']
+
+        peak_rss = {}
+        for _, pid, rss in self.memory:
+            peak_rss[pid] = max(peak_rss.get(pid, 0), rss)
+
+        return {
+            'wall_seconds': time.perf_counter() - self.origin,
+            'stages': dict(sorted(stages.items(), key=lambda item: -item[1]['total_seconds'])),
+            'counters': dict(self.counters),
+            'peak_rss_mb': max(peak_rss.values()) / (1024 * 1024) if peak_rss else None,
+            'peak_rss_mb_per_process': {str(pid): rss / (1024 * 1024) for pid, rss in peak_rss.items()},
+        }
+
+    def chrome_trace(self):
+        """Events in the Chrome trace-event format, times in microseconds"""
+        def timestamp(t):
+            return (t - self.origin) * 1e6
+
+        events = [
+            {'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}}
+            for (pid, tid), name in self.thread_names.items()
+        ]
+        events += [
+            {'name': name, 'cat': 'nocle', 'ph': 'X', 'pid': pid, 'tid': tid,
+             'ts': timestamp(start), 'dur': duration * 1e6, 'args': args}
+            for name, pid, tid, start, duration, args in self.spans
+        ]
+        events += [
+            {'name': 'memory', 'ph': 'C', 'pid': pid, 'ts': timestamp(t), 'args': {'rss_mb': rss / (1024 * 1024)}}
+            for t, pid, rss in self.memory
+        ]
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def write_summary(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.summary(), f, indent=2)
+
+    def write_chrome_trace(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.chrome_trace(), f)
+
+    def format_summary(self):
+        """Per-stage table for printing"""
+        summary = self.summary()
+        lines = [f"{'stage':>28} {'calls':>7} {'total s':>9} {'mean ms':>9} {'max ms':>9}"]
+        for name, stage in summary['stages'].items():
+            lines.append(f"{name:>28} {stage['calls']:>7} {stage['total_seconds']:>9.3f} "
+                         f"{stage['mean_seconds'] * 1000:>9.2f} {stage['max_seconds'] * 1000:>9.2f}")
+        for name, value in summary['counters'].items():
+            lines.append(f"{name:>28} {value:>7g}")
+        if summary['peak_rss_mb'] is not None:
+            lines.append(f"Peak RSS {summary['peak_rss_mb']:.0f} MB")
+        return "\n".join(lines)
+
+def span(name, **args):
+    """Time a block on the active tracer, a no-op when tracing is off"""
+    tracer = _active
+    if tracer is None:
+        return _null_span
+    return tracer.span(name, **args)
+
+def count(name, value=1):
+    """Add to a counter on the active tracer, a no-op when tracing is off"""
+    tracer = _active
+    if tracer is not None:
+        tracer.count(name, value)
+
+def activate(tracer):
+    """Make tracer record spans from every thread until deactivate()"""
+    global _active
+    _active = tracer
+    tracer.start()
+
+def deactivate():
+    global _active
+    if _active is not None:
+        _active.stop()
+    _active = None
+
+@contextmanager
+def tracing(tracer):
+    """Record on tracer while the block runs, a no-op for None"""
+    if tracer is None:
+        yield None
+        return
+    previous = _active
+    activate(tracer)
+    try:
+        yield tracer
+    finally:
+        deactivate()
+        if previous is not None:
+            activate(previous)
+
+@contextmanager
+def profiling(path):
+    """cProfile the calling thread and write pstats to path, a no-op for a falsy path
+
+    View the result with `python -m pstats` or snakeviz. Worker threads are
+    not included, use a sampling profiler such as py-spy for those.
+    """
+    if not path:
+        yield None
+        return
+    import cProfile
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
@@ -0,0 +1,32 @@
+import importlib
+
+class LazyModule:
+    """Stand-in for a module that is imported on first attribute access"""
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            # importlib locks per module, so threads importing the same module
+            # wait for one import while other lazy modules load in parallel
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module '{self._name}' ({state})>"
+
+def lazy_import(name):
+    """Return a proxy for `name`, the real import happens when it is first used"""
+    return LazyModule(name)
+
+def is_loaded(module):
+    """Check whether a lazy module has been imported yet"""
+    return not isinstance(module, LazyModule) or module._module is not None
@@ -0,0 +1,224 @@
+import itertools
+import os
+import tempfile
+
+import numpy as np
+
+from audio_processor import AudioProcessor
+from filter_chain import FilterChain
+from filters import AudioFilters
+from instrumentation import span
+from setup import Setup
+from spectral import QuantileSketch, StreamingSpectralGate
+
+class MappedSignal:
+    """Mono signal stored on disk as int16 or float16 samples
+
+    Blocks are read and written as float32 through a memory map of just
+    that block, so resident memory depends on the block size and not on
+    the signal length. int16 covers [-1, 1) and clips beyond it, float16
+    keeps values above full scale.
+    """
+    DTYPES = ('int16', 'float16', 'float32')
+
+    def __init__(self, path, length, dtype=Setup.MAPPED_DTYPE):
+        if dtype not in self.DTYPES:
+            raise ValueError(f"Unknown mapped dtype: {dtype}")
+        self.path = path
+        self.length = length
+        self.dtype = np.dtype(dtype)
+
+    @classmethod
+    def create(cls, path, length, dtype=Setup.MAPPED_DTYPE):
+        """Allocate a zero-filled signal of `length` samples"""
+        signal = cls(path, length, dtype)
+        with open(path, 'wb') as f:
+            f.truncate(length * signal.dtype.itemsize)
+        return signal
+
+    @classmethod
+    def from_blocks(cls, path, blocks, dtype=Setup.MAPPED_DTYPE):
+        """Write float32 blocks one after another into a new signal"""
+        signal = cls(path, 0, dtype)
+        with open(path, 'wb') as f:
+            for block in blocks:
+                signal.encode(block).tofile(f)
+                signal.length += len(block)
+        return signal
+
+    def __len__(self):
+        return self.length
+
+    def encode(self, samples):
+        if self.dtype == np.int16:
+            return AudioProcessor.to_pcm16(samples)
+        return np.asarray(samples).astype(self.dtype)
+
+    def _map(self, start, stop, mode):
+        return np.memmap(self.path, dtype=self.dtype, mode=mode,
+                         offset=start * self.dtype.itemsize, shape=(stop - start,))
+
+    def read(self, start, stop):
+        """Samples [start, stop) as float32"""
+        stop = min(stop, self.length)
+        if stop <= start:
+            return np.zeros(0, dtype=np.float32)
+        block = self._map(start, stop, 'r')
+        if self.dtype == np.int16:
+            return block.astype(np.float32) / 32768.0
+        return block.astype(np.float32)
+
+    def write(self, start, samples):
+        if len(samples) == 0:
+            return
+        block = self._map(start, start + len(samples), 'r+')
+        block[:] = self.encode(samples)
+        block.flush()
+
+    def blocks(self, block_size):
+        """Yield (start, float32 samples) blocks covering the signal"""
+        for start in range(0, self.length, block_size):
+            yield start, self.read(start, start + block_size)
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+class MappedPipeline:
+    """Denoise and filter long files with intermediate signals on disk
+
+    Decoded, denoised and filtered signals are stored as MappedSignal in
+    a compact dtype and every stage runs block by block in float32, so
+    peak memory stays bounded however long the input is. Windowed filters
+    read a halo around each block and give the same output as on the
+    whole signal. Spectral gating takes a first pass to build the noise
+    floor over the whole signal. Dynamic expansion takes a second pass to
+    normalise by the peak.
+    """
+    def __init__(self, model_handler, filter_chain=None, dtype=Setup.MAPPED_DTYPE,
+                 batching_size=Setup.BATCH_SIZE, block_chunks=Setup.STREAM_BLOCK_CHUNKS,
+                 directory=Setup.MAPPED_DIR):
+        self.model_handler = model_handler
+        self.audio_processor = model_handler.audio_processor
+        self.filter_chain = filter_chain or FilterChain()
+        self.dtype = dtype
+        self.batching_size = batching_size
+        self.block_size = batching_size * block_chunks
+        self.directory = directory
+
+    def process(self, input_path, output_path, inference_batch_size=None):
+        """Denoise input_path into a 16-bit WAV at output_path and return the samples written"""
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+        with tempfile.TemporaryDirectory(prefix="nocle-mapped-", dir=self.directory) as directory:
+            self._paths = (os.path.join(directory, f"{i}.raw") for i in itertools.count())
+            with span("decode"):
+                signal = MappedSignal.from_blocks(
+                    next(self._paths), self.audio_processor.iter_blocks(input_path, self.block_size), self.dtype)
+            signal = self._replace(signal, self._infer(signal, inference_batch_size))
+            for step in self.filter_chain.compile():
+                with span(f"filter:{step.name}"):
+                    signal = self._replace(signal, self._filter(step, signal))
+            with span("save"):
+                self._save(signal, output_path)
+            return len(signal)
+
+    @staticmethod
+    def _replace(previous, signal):
+        if signal is not previous:
+            previous.remove()
+        return signal
+
+    def _new_signal(self, length):
+        return MappedSignal.create(next(self._paths), length, self.dtype)
+
+    def _infer(self, signal, inference_batch_size):
+        output = self._new_signal(len(signal))
+        # Blocks are whole chunks, so chunk boundaries match ModelHandler.predict
+        for start, block in signal.blocks(self.block_size):
+            chunks = AudioProcessor.chunk_audio(block, self.batching_size)
+            predicted = self.model_handler.infer_chunks(chunks, inference_batch_size)
+            output.write(start, predicted.reshape(-1)[:len(block)])
+        return output
+
+    def _filter(self, step, signal):
+        params = getattr(step, 'params', {})
+        if step.name == 'noise_gate':
+            return self._map_blocks(signal, lambda block: AudioFilters.noise_gate(block, **params))
+        if step.name == 'dynamic_expansion':
+            return self._expand(signal, lambda block: AudioFilters.dynamic_expansion(
+                block, normalize=False, **params))
+        if step.name == 'noise_gate+dynamic_expansion':
+            return self._expand(signal, lambda block: AudioFilters.gate_and_expand(
+                block, step.gate_threshold, normalize=False, **step.expansion_params))
+        if step.name == 'exponential_smooth':
+            return self._smooth(signal, **params)
+        if step.name == 'wiener_filter':
+            size = params.get('mysize', Setup.WIENER_FILTER_SIZE)
+            return self._windowed(signal, lambda block: AudioFilters.wiener_filter(block, **params), size // 2)
+        if step.name == 'gaussian_blur':
+            sigma = params.get('sigma', Setup.GAUSSIAN_BLUR_SIGMA)
+            # Radius of scipy's kernel with the default truncate=4.0
+            return self._windowed(signal, lambda block: AudioFilters.gaussian_blur(block, **params),
+                                  int(4.0 * sigma + 0.5))
+        if step.name == 'spectral_gating':
+            return self._spectral_gate(signal, **params)
+        raise ValueError(f"Filter stage {step.name} can't run on mapped storage")
+
+    def _map_blocks(self, signal, function):
+        """Sample-wise stage, written back in place"""
+        for start, block in signal.blocks(self.block_size):
+            signal.write(start, function(block))
+        return signal
+
+    def _expand(self, signal, function):
+        """Expand every block, then divide by the peak over the whole signal"""
+        output = self._new_signal(len(signal))
+        peak = 0.0
+        for start, block in signal.blocks(self.block_size):
+            expanded = function(block)
+            peak = max(peak, float(np.max(np.abs(expanded), initial=0.0)))
+            output.write(start, expanded)
+        for start, block in output.blocks(self.block_size):
+            output.write(start, block / np.float32(peak))
+        return output
+
+    def _smooth(self, signal, alpha=Setup.EXPONENTIAL_SMOOTH_ALPHA):
+        previous = None
+        for start, block in signal.blocks(self.block_size):
+            smoothed, previous = AudioFilters.exponential_smooth_chunk(block, alpha, previous)
+            signal.write(start, smoothed)
+        return signal
+
+    def _windowed(self, signal, function, halo):
+        """Filter each block with `halo` neighbouring samples on both sides"""
+        output = self._new_signal(len(signal))
+        for start in range(0, len(signal), self.block_size):
+            stop = min(start + self.block_size, len(signal))
+            low = max(0, start - halo)
+            filtered = function(signal.read(low, stop + halo))
+            output.write(start, filtered[start - low:start - low + stop - start])
+        return output
+
+    def _spectral_gate(self, signal, threshold=Setup.SPECTRAL_GATE_THRESHOLD):
+        """Median noise floor over the whole signal in a first pass, gating in a second"""
+        sketch = QuantileSketch(Setup.SPECTRAL_GATE_N_FFT // 2 + 1, decay=1.0)
+        analysis = StreamingSpectralGate(threshold=threshold, sketch=sketch)
+        for _, block in signal.blocks(self.block_size):
+            analysis.observe(block)
+        analysis.observe(None)
+
+        gate = StreamingSpectralGate(threshold=threshold, sketch=sketch, update=False)
+        output = self._new_signal(len(signal))
+        position = 0
+        for _, block in signal.blocks(self.block_size):
+            gated = gate.process(block)
+            output.write(position, gated)
+            position += len(gated)
+        output.write(position, gate.flush())
+        return output
+
+    def _save(self, signal, output_path):
+        with self.audio_processor.open_writer(output_path) as writer:
+            for _, block in signal.blocks(self.block_size):
+                writer.write(AudioProcessor.to_pcm16(block))
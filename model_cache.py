@@ -0,0 +1,94 @@
+import hashlib
+import os
+import shutil
+import tempfile
+
+from setup import Setup
+from lazy_imports import lazy_import
+
+tf = lazy_import("tensorflow")
+
+QUANTIZATIONS = (None, 'float16', 'dynamic')
+
+def file_hash(path, block_size=1 << 20):
+    """Return the SHA-256 hex digest of a file"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+class ModelArtifactCache:
+    """Inference-only model artifacts converted once from the Keras HDF5 file
+
+    Artifacts are keyed by a hash of the source file, so replacing the
+    model invalidates them automatically.
+    """
+    def __init__(self, cache_dir=Setup.MODEL_CACHE_DIR):
+        self.cache_dir = cache_dir
+
+    def artifact_path(self, model_path, artifact_format, quantization=None):
+        """Path of the cached artifact for a model file"""
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization: {quantization}")
+        name = f"{file_hash(model_path)[:16]}-{artifact_format}"
+        if quantization:
+            name += f"-{quantization}"
+        if artifact_format == 'tflite':
+            name += ".tflite"
+        return os.path.join(self.cache_dir, name)
+
+    def get_saved_model(self, model_path):
+        """Return the SavedModel directory for model_path, exporting it on first use"""
+        path = self.artifact_path(model_path, 'savedmodel')
+        if not os.path.isdir(path):
+            model = tf.keras.models.load_model(model_path, compile=False)
+            self._publish(path, lambda tmp_path: self._export_saved_model(model, tmp_path))
+        return path
+
+    def get_tflite(self, model_path, quantization=None):
+        """Return the TFLite flatbuffer for model_path, converting it on first use"""
+        path = self.artifact_path(model_path, 'tflite', quantization)
+        if not os.path.isfile(path):
+            model = tf.keras.models.load_model(model_path, compile=False)
+            self._publish(path, lambda tmp_path: self._export_tflite(model, tmp_path, quantization))
+        return path
+
+    def _publish(self, path, export):
+        """Export into a temporary path and move it into place once complete"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(dir=self.cache_dir, prefix=".export-")
+        try:
+            tmp_path = os.path.join(tmp_dir, os.path.basename(path))
+            export(tmp_path)
+            try:
+                os.replace(tmp_path, path)
+            except OSError:
+                # Another process published the same artifact first
+                if not os.path.exists(path):
+                    raise
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    @staticmethod
+    def _export_saved_model(model, path):
+        signature = tf.TensorSpec((None,) + tuple(model.input_shape[1:]), tf.float32)
+
+        @tf.function(input_signature=[signature])
+        def serve(batch):
+            return model(batch, training=False)
+
+        module = tf.Module()
+        module.model = model
+        module.serve = serve
+        tf.saved_model.save(module, path, signatures={'serving_default': serve})
+
+    @staticmethod
+    def _export_tflite(model, path, quantization):
+        converter = tf.lite.TFLiteConverter.from_keras_model(model)
+        if quantization:
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        if quantization == 'float16':
+            converter.target_spec.supported_types = [tf.float16]
+        with open(path, 'wb') as f:
+            f.write(converter.convert())
@@ -1,5 +1,4 @@
 import os
-import requests
 
 def download_model():
     # Create directory for model if it doesn't exist
@@ -14,6 +13,8 @@ def download_model():
         print("✅ Model already exists:", model_path)
         return True
 
+    import requests
+
     # Use LFS URL format and proper headers for binary file download
     url = "https://huggingface.co/haydarkadioglu/nocle-app/resolve/main/nocle.hdf5"
     headers = {
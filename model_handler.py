@@ -1,52 +1,387 @@
-import tensorflow as tf
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 import numpy as np
 
+from setup import Setup
+from instrumentation import count, span
+from lazy_imports import lazy_import
+from model_cache import ModelArtifactCache, file_hash
+
+tf = lazy_import("tensorflow")
+
+class ProcessingCancelled(Exception):
+    """Raised by a progress callback to stop inference between batches"""
+
+def _available_memory():
+    """Return the available physical memory in bytes, or None if unknown"""
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+def _batches(n_chunks, step, timed=False):
+    """Yield (start, stop) chunk ranges of the forward passes
+
+    With timed=True passes start at one chunk and are resized from the
+    measured time per chunk to take about Setup.PROGRESS_INTERVAL, at most
+    `step` chunks, so progress and cancellation stay responsive without
+    giving up large batches on fast models. Sizes are powers of two so
+    timing noise doesn't resize TFLite inputs on every pass.
+    """
+    size = 1 if timed else step
+    start = 0
+    while start < n_chunks:
+        stop = min(start + size, n_chunks)
+        began = time.perf_counter()
+        yield start, stop
+        if timed:
+            elapsed = time.perf_counter() - began
+            fits = int(Setup.PROGRESS_INTERVAL * (stop - start) / elapsed) if elapsed > 0 else step
+            size = min(step, 1 << max(0, fits.bit_length() - 1))
+        start = stop
+
+class InterpreterPool:
+    """Thread-safe pool of TFLite interpreters for one model file"""
+    def __init__(self, model_path, size=Setup.TFLITE_POOL_SIZE, num_threads=Setup.TFLITE_NUM_THREADS):
+        self.model_path = model_path
+        self.size = size
+        self.num_threads = num_threads
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def acquire(self):
+        """Borrow an interpreter, blocking while all of them are busy"""
+        interpreter = self._take()
+        try:
+            yield interpreter
+        finally:
+            self._idle.put(interpreter)
+
+    def _take(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            create = self._created < self.size
+            if create:
+                self._created += 1
+        if create:
+            try:
+                interpreter = tf.lite.Interpreter(model_path=self.model_path, num_threads=self.num_threads)
+                interpreter.allocate_tensors()
+            except BaseException:
+                # Free the slot, or later callers would wait for an interpreter that never comes
+                with self._lock:
+                    self._created -= 1
+                raise
+            return interpreter
+        return self._idle.get()
+
+    @staticmethod
+    def invoke(interpreter, audio_batches):
+        """Run one invoke over a (n_chunks, batching_size) batch, resizing the input if needed"""
+        input_details = interpreter.get_input_details()[0]
+        output_details = interpreter.get_output_details()[0]
+        n_chunks, batching_size = audio_batches.shape
+
+        shape = [n_chunks, batching_size, 1]
+        if list(input_details['shape']) != shape:
+            interpreter.resize_tensor_input(input_details['index'], shape)
+            interpreter.allocate_tensors()
+
+        interpreter.set_tensor(input_details['index'], audio_batches[..., np.newaxis].astype(np.float32))
+        interpreter.invoke()
+        return interpreter.get_tensor(output_details['index']).reshape(n_chunks, batching_size)
+
+_interpreter_pools = {}
+_interpreter_pools_lock = threading.Lock()
+
+def get_interpreter_pool(model_path, num_threads=Setup.TFLITE_NUM_THREADS, size=Setup.TFLITE_POOL_SIZE):
+    """Return the cached interpreter pool for a TFLite model path, holding at least `size` interpreters"""
+    key = (os.path.abspath(model_path), num_threads)
+    with _interpreter_pools_lock:
+        if key not in _interpreter_pools:
+            _interpreter_pools[key] = InterpreterPool(model_path, size, num_threads)
+        pool = _interpreter_pools[key]
+    with pool._lock:
+        pool.size = max(pool.size, size)
+    return pool
+
+def configure_threads(intra_op=Setup.TF_INTRA_OP_THREADS, inter_op=Setup.TF_INTER_OP_THREADS):
+    """Set TensorFlow's thread pools, None leaves a setting unchanged
+
+    Only takes effect before TensorFlow runs its first op.
+    """
+    try:
+        if intra_op:
+            tf.config.threading.set_intra_op_parallelism_threads(intra_op)
+        if inter_op:
+            tf.config.threading.set_inter_op_parallelism_threads(inter_op)
+    except RuntimeError as e:
+        print(f"⚠️ TensorFlow threads are already initialized: {str(e)}")
+
 class ModelHandler:
-    def __init__(self, model_path, audio_processor):
-        from setup import Setup
-        self.model = tf.keras.models.load_model(model_path)
-        # Compile the model with configured optimizer and loss
-        self.model.compile(optimizer=Setup.MODEL_OPTIMIZER, loss=Setup.MODEL_LOSS)
+    def __init__(self, model_path, audio_processor, inference_batch_size=Setup.INFERENCE_BATCH_SIZE,
+                 artifact_format=Setup.MODEL_ARTIFACT_FORMAT, quantization=Setup.MODEL_QUANTIZATION,
+                 warm_up=Setup.MODEL_WARM_UP, workers=Setup.INFERENCE_WORKERS,
+                 intra_op_threads=Setup.TF_INTRA_OP_THREADS, inter_op_threads=Setup.TF_INTER_OP_THREADS):
         self.audio_processor = audio_processor
+        self.inference_batch_size = inference_batch_size
+        self.workers = max(1, workers or 1)
+        self._executor = None
+        self.model_path = model_path
+        self.quantization = quantization
+        self.model = None
+        self.tflite_model_path = None
+        self._model_id = None
+
+        if intra_op_threads or inter_op_threads:
+            configure_threads(intra_op_threads, inter_op_threads)
+        try:
+            self._load(model_path, artifact_format, quantization)
+        except Exception as e:
+            if artifact_format == 'keras':
+                raise
+            print(f"⚠️ Could not use cached {artifact_format} model, loading Keras model: {str(e)}")
+            artifact_format = 'keras'
+            self._load(model_path, artifact_format, quantization)
+        self.artifact_format = artifact_format
+
+        if warm_up:
+            self.warm_up()
+
+    def _load(self, model_path, artifact_format, quantization):
+        """Load the model in the requested inference format"""
+        if artifact_format == 'keras':
+            # Inference only, no optimizer or loss needed
+            self.model = tf.keras.models.load_model(model_path, compile=False)
+            signature = tf.TensorSpec((None,) + tuple(self.model.input_shape[1:]), tf.float32)
+            # Call the model directly instead of paying predict() dispatch per batch
+            self._infer = tf.function(self._forward, input_signature=[signature])
+        elif artifact_format == 'savedmodel':
+            self._saved_model = tf.saved_model.load(ModelArtifactCache().get_saved_model(model_path))
+            self._infer = self._saved_model.serve
+        elif artifact_format == 'tflite':
+            self.tflite_model_path = ModelArtifactCache().get_tflite(model_path, quantization)
+        else:
+            raise ValueError(f"Unknown model format: {artifact_format}")
+
+    @property
+    def model_id(self):
+        """Identifies the weights and inference format, used to key cached results"""
+        if self._model_id is None:
+            self._model_id = f"{file_hash(self.model_path)}-{self.artifact_format}"
+            if self.artifact_format == 'tflite' and self.quantization:
+                self._model_id += f"-{self.quantization}"
+        return self._model_id
+
+    def _forward(self, batch):
+        return self.model(batch, training=False)
+
+    def warm_up(self, batching_size=Setup.BATCH_SIZE):
+        """Run a silent chunk so the first real request doesn't pay tracing cost"""
+        self.infer_chunks(np.zeros((1, batching_size), dtype=np.float32))
+
+    def _resolve_batch_size(self, n_chunks, batching_size, inference_batch_size=None):
+        """Pick how many chunks are sent to the model per forward pass"""
+        batch_size = inference_batch_size or self.inference_batch_size
+        if batch_size is None:
+            available = _available_memory()
+            if available is None:
+                batch_size = Setup.INFERENCE_BATCH_SIZE_FALLBACK
+            else:
+                chunk_bytes = batching_size * Setup.INFERENCE_BYTES_PER_SAMPLE
+                batch_size = int(available * Setup.INFERENCE_MEMORY_FRACTION // chunk_bytes)
+            batch_size = min(batch_size, Setup.INFERENCE_MAX_BATCH_SIZE)
+        return max(1, min(batch_size, n_chunks))
+
+    def infer_chunks(self, audio_batches, inference_batch_size=None, progress=None):
+        """Run the model over (n_chunks, batching_size) chunks, several chunks per call
+
+        progress(done, total) is called with chunk counts after every forward
+        pass and may raise ProcessingCancelled to stop early; passes are then
+        sized by time, see _batches(). With more than one worker, batches run
+        on a thread pool and are written back in order.
+        """
+        n_chunks, batching_size = audio_batches.shape
+        step = self._resolve_batch_size(n_chunks, batching_size, inference_batch_size)
+        if self.workers > 1 and n_chunks > 1:
+            # Every worker gets batches and in-flight chunks stay within the memory budget
+            step = max(1, min(step // self.workers, -(-n_chunks // self.workers)))
+            return self._infer_parallel(audio_batches, step, progress)
+
+        if self.tflite_model_path:
+            return self._infer_tflite(audio_batches, self.tflite_model_path, step, progress=progress)
+
+        predicted = np.empty((n_chunks, batching_size), dtype=np.float32)
+        for start, stop in _batches(n_chunks, step, timed=progress is not None):
+            predicted[start:stop] = self._infer_batch(audio_batches[start:stop])
+            if progress is not None:
+                progress(stop, n_chunks)
+        return predicted
+
+    def _infer_batch(self, batch):
+        """One forward pass over a (n, batching_size) batch"""
+        count("chunks_inferred", len(batch))
+        if self.tflite_model_path:
+            pool = get_interpreter_pool(self.tflite_model_path, size=self.workers)
+            with pool.acquire() as interpreter, span("infer", chunks=len(batch)):
+                return pool.invoke(interpreter, batch)
+        with span("infer", chunks=len(batch)):
+            # Feed a view of the chunk buffer, no intermediate TF stack
+            frames = self._infer(batch[..., np.newaxis])
+            return tf.reshape(frames, (-1, batch.shape[1])).numpy()
+
+    def _infer_parallel(self, audio_batches, step, progress=None):
+        """Run batches on the worker threads, TF and TFLite release the GIL while computing"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="inference")
+        n_chunks = len(audio_batches)
+        predicted = np.empty(audio_batches.shape, dtype=np.float32)
+        futures = {
+            self._executor.submit(self._infer_batch, audio_batches[start:start + step]): start
+            for start in range(0, n_chunks, step)
+        }
+        done = 0
+        try:
+            for future in as_completed(futures):
+                start = futures[future]
+                result = future.result()
+                predicted[start:start + len(result)] = result
+                done += len(result)
+                if progress is not None:
+                    progress(done, n_chunks)
+        finally:
+            # Drop queued batches after an error or cancellation
+            for future in futures:
+                future.cancel()
+        return predicted
+
+    @staticmethod
+    def _infer_tflite(audio_batches, tflite_model_path, step, num_threads=Setup.TFLITE_NUM_THREADS,
+                      progress=None):
+        """Run (n_chunks, batching_size) chunks through a pooled TFLite interpreter"""
+        n_chunks = len(audio_batches)
+        predicted = np.empty(audio_batches.shape, dtype=np.float32)
+        pool = get_interpreter_pool(tflite_model_path, num_threads)
+        with pool.acquire() as interpreter:
+            for start, stop in _batches(n_chunks, step, timed=progress is not None):
+                with span("infer", chunks=stop - start):
+                    predicted[start:stop] = pool.invoke(interpreter, audio_batches[start:stop])
+                count("chunks_inferred", stop - start)
+                if progress is not None:
+                    progress(stop, n_chunks)
+        return predicted
+
+    def predict(self, source, batching_size=12000, use_filters=False, filter_params=None,
+                inference_batch_size=None, overlap=Setup.OVERLAP_SIZE,
+                window=Setup.OVERLAP_WINDOW, progress=None):
+        """Make prediction using the model, source is a path or DecodedAudio
+
+        With a non-zero overlap, chunks advance by batching_size - overlap
+        samples and neighbouring outputs are crossfaded with `window`.
+        The chunks of all channels of multi-channel audio run through the
+        model together. progress is passed on to infer_chunks().
+        """
+        audio = self.audio_processor.load(source)
+        if overlap:
+            return self._predict_overlap_add(
+                audio, batching_size, overlap, window, inference_batch_size, progress)
+
+        audio_batches = self.audio_processor.get_audio_in_batches(audio, batching_size)
+        predicted = self.infer_chunks(audio_batches, inference_batch_size, progress)
+        return self.audio_processor.unchunk(predicted, len(audio), audio.channels)
+
+    def _predict_overlap_add(self, audio, batching_size, overlap, window, inference_batch_size,
+                             progress=None):
+        if not 0 < overlap <= batching_size // 2:
+            raise ValueError(f"Overlap must be between 1 and {batching_size // 2} samples")
+
+        with span("chunk"):
+            frames = self.audio_processor.frame_audio(audio.samples, batching_size, overlap)
+        predicted = self.infer_chunks(frames, inference_batch_size, progress)
+        with span("overlap_add"):
+            return self.audio_processor.overlap_add(predicted, len(audio), overlap, window, audio.channels)
+
+    def predict_many(self, sources, batching_size=12000, inference_batch_size=None,
+                     overlap=Setup.OVERLAP_SIZE, window=Setup.OVERLAP_WINDOW,
+                     max_chunks=Setup.PACK_MAX_CHUNKS, progress=None):
+        """Denoise many paths, arrays or DecodedAudio and return the outputs in order
+
+        See iter_predict_many(), every output equals predict() on its source.
+        """
+        outputs = []
+        for _, output in self.iter_predict_many(sources, batching_size, inference_batch_size,
+                                                overlap, window, max_chunks, progress):
+            outputs.append(output)
+        return outputs
+
+    def iter_predict_many(self, sources, batching_size=12000, inference_batch_size=None,
+                          overlap=Setup.OVERLAP_SIZE, window=Setup.OVERLAP_WINDOW,
+                          max_chunks=Setup.PACK_MAX_CHUNKS, progress=None):
+        """Yield (index, output) for each source, in order
+
+        The chunks of consecutive sources are packed into one contiguous
+        array of up to max_chunks chunks, so forward passes span file
+        boundaries and short files share batches instead of paying the
+        per-call overhead each. progress is passed to infer_chunks() and
+        counts the chunks of the current group.
+        """
+        if overlap and not 0 < overlap <= batching_size // 2:
+            raise ValueError(f"Overlap must be between 1 and {batching_size // 2} samples")
+
+        group = []  # (index, DecodedAudio, chunks)
+        n_chunks = 0
+        for index, source in enumerate(sources):
+            audio = self.audio_processor.load(source)
+            with span("chunk"):
+                if overlap:
+                    chunks = self.audio_processor.frame_audio(audio.samples, batching_size, overlap)
+                else:
+                    chunks = self.audio_processor.chunk_audio(audio.samples, batching_size)
+            if group and n_chunks + len(chunks) > max_chunks:
+                yield from self._predict_packed(group, inference_batch_size, overlap, window, progress)
+                group, n_chunks = [], 0
+            group.append((index, audio, chunks))
+            n_chunks += len(chunks)
+        if group:
+            yield from self._predict_packed(group, inference_batch_size, overlap, window, progress)
+
+    def _predict_packed(self, group, inference_batch_size, overlap, window, progress):
+        """Run the chunks of a group as one array and split the output per source"""
+        with span("pack", sources=len(group)):
+            packed = np.concatenate([chunks for _, _, chunks in group])
+        predicted = self.infer_chunks(packed, inference_batch_size, progress)
+
+        start = 0
+        for index, audio, chunks in group:
+            output = predicted[start:start + len(chunks)]
+            start += len(chunks)
+            if overlap:
+                with span("overlap_add"):
+                    output = self.audio_processor.overlap_add(output, len(audio), overlap, window,
+                                                              audio.channels)
+                yield index, output
+            else:
+                yield index, self.audio_processor.unchunk(output, len(audio), audio.channels)
+
+    def predict_tflite(self, source, tflite_model_path, batching_size=12000,
+                       num_threads=Setup.TFLITE_NUM_THREADS, inference_batch_size=None, progress=None):
+        """Make prediction using TFLite model, source is a path or DecodedAudio
+
+        Interpreters are cached per model path and each invoke processes
+        several chunks by resizing the batch dimension of the input.
+        """
+        audio = self.audio_processor.load(source)
+        audio_batches = self.audio_processor.get_audio_in_batches(audio, batching_size)
 
-    def predict(self, path, batching_size=12000, use_filters=False, filter_params=None):
-        """Make prediction using the model"""
-        audio_batches = self.audio_processor.get_audio_in_batches(path, batching_size)
-        original_length = len(self.audio_processor.get_audio(path))
-        
-        predicted_batches = []
-        for batch in audio_batches:
-            frame = tf.squeeze(
-                self.model.predict(
-                    tf.expand_dims(tf.expand_dims(batch, -1), 0),
-                    verbose=0
-                )
-            )
-            predicted_batches.append(frame.numpy())
-        
-        predicted_audio = np.concatenate(predicted_batches)
-        predicted_audio = predicted_audio[:original_length]
-        
-        return predicted_audio
-
-    def predict_tflite(self, path, tflite_model_path, batching_size=12000):
-        """Make prediction using TFLite model"""
-        interpreter = tf.lite.Interpreter(model_path=tflite_model_path)
-        interpreter.allocate_tensors()
-        
-        input_details = interpreter.get_input_details()
-        output_details = interpreter.get_output_details()
-        
-        audio_batches = self.audio_processor.get_audio_in_batches(path, batching_size)
-        original_length = len(self.audio_processor.get_audio(path))
-        
-        predicted_batches = []
-        for batch in audio_batches:
-            input_data = np.expand_dims(np.expand_dims(batch, -1), 0).astype(np.float32)
-            interpreter.set_tensor(input_details[0]['index'], input_data)
-            interpreter.invoke()
-            frame = interpreter.get_tensor(output_details[0]['index'])
-            predicted_batches.append(frame.squeeze())
-        
-        predicted_audio = np.concatenate(predicted_batches)
-        return predicted_audio[:original_length]
\ No newline at end of file
+        step = self._resolve_batch_size(len(audio_batches), batching_size, inference_batch_size)
+        predicted = self._infer_tflite(audio_batches, tflite_model_path, step, num_threads, progress)
+        return self.audio_processor.unchunk(predicted, len(audio), audio.channels)
@@ -96,10 +96,14 @@ def dynamic_expansion(data, threshold=0.35, ratio=1.5):
 
 
 def exponential_smooth(data, alpha=0.9):
+    from scipy.signal import lfilter
     smoothed = np.zeros_like(data)
     smoothed[0] = data[0]
-    for t in range(1, len(data)):
-        smoothed[t] = alpha * data[t] + (1 - alpha) * smoothed[t-1]
+    # smoothed[t] = alpha * data[t] + (1 - alpha) * smoothed[t-1], tek geçişte IIR filtre
+    b = np.array([alpha], dtype=data.dtype)
+    a = np.array([1, alpha - 1], dtype=data.dtype)
+    zi = np.array([1 - alpha], dtype=data.dtype) * data[0]
+    smoothed[1:], _ = lfilter(b, a, data[1:], zi=zi)
     return smoothed
 """
 
@@ -0,0 +1,294 @@
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from audio_processor import AudioProcessor
+from setup import Setup
+from lazy_imports import lazy_import
+
+sd = lazy_import("sounddevice")
+sf = lazy_import("soundfile")
+
+class RingBuffer:
+    """Fixed-capacity single-channel sample FIFO"""
+    def __init__(self, capacity):
+        self._data = np.zeros(capacity, dtype=np.float32)
+        self._start = 0
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @property
+    def available(self):
+        return self._size
+
+    def write(self, samples):
+        """Append samples, dropping the oldest ones if the buffer is full"""
+        with self._lock:
+            capacity = len(self._data)
+            samples = samples[-capacity:]
+            overflow = max(0, self._size + len(samples) - capacity)
+            self._start = (self._start + overflow) % capacity
+            self._size -= overflow
+
+            end = (self._start + self._size) % capacity
+            first = min(len(samples), capacity - end)
+            self._data[end:end + first] = samples[:first]
+            self._data[:len(samples) - first] = samples[first:]
+            self._size += len(samples)
+            return overflow
+
+    def read(self, count):
+        """Remove and return up to `count` samples"""
+        with self._lock:
+            count = min(count, self._size)
+            indices = (self._start + np.arange(count)) % len(self._data)
+            samples = self._data[indices]
+            self._start = (self._start + count) % len(self._data)
+            self._size -= count
+            return samples
+
+class RealtimeDenoiser:
+    """Denoise a live signal hop by hop with crossfaded overlapping chunks
+
+    Every call to process_hop() consumes `hop` new samples and returns `hop`
+    output samples. The output lags the input by `overlap` samples, matching
+    the front padding of AudioProcessor.frame_audio().
+    """
+    def __init__(self, model_handler, chunk_size=Setup.REALTIME_CHUNK_SIZE,
+                 overlap=Setup.REALTIME_OVERLAP, window=Setup.OVERLAP_WINDOW):
+        if not 0 <= overlap <= chunk_size // 2:
+            raise ValueError(f"Overlap must be between 0 and {chunk_size // 2} samples")
+        self.model_handler = model_handler
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self.hop = chunk_size - overlap
+        self._window = AudioProcessor.crossfade_window(chunk_size, overlap, window)
+        self._frame = np.zeros((1, chunk_size), dtype=np.float32)
+        self._tail = np.zeros(overlap, dtype=np.float32)
+
+    def process_hop(self, samples):
+        """Denoise the next `hop` input samples"""
+        # Slide the last `overlap` input samples to the front and append the new hop
+        self._frame[0, :self.overlap] = self._frame[0, self.hop:]
+        self._frame[0, self.overlap:] = samples
+
+        predicted = self.model_handler.infer_chunks(self._frame)[0] * self._window
+        output = predicted[:self.hop].copy()
+        output[:self.overlap] += self._tail
+        self._tail = predicted[self.hop:]
+        return output
+
+def measure_inference_time(model_handler, chunk_size, repeats=3):
+    """Best-of time in seconds for one chunk, None if the model rejects the size"""
+    chunk = np.zeros((1, chunk_size), dtype=np.float32)
+    try:
+        model_handler.infer_chunks(chunk)
+    except Exception:
+        return None
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        model_handler.infer_chunks(chunk)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def choose_chunk_size(model_handler, latency_budget=Setup.REALTIME_LATENCY_BUDGET,
+                      sample_rate=Setup.SAMPLE_RATE, candidates=Setup.REALTIME_CHUNK_SIZES,
+                      overlap_ratio=Setup.REALTIME_OVERLAP_RATIO, jitter=Setup.REALTIME_JITTER_SAMPLES):
+    """Pick the largest chunk size whose expected latency fits the budget in seconds
+
+    Falls back to the smallest chunk size the model accepts when none fits.
+    Returns (chunk_size, overlap, expected latency in seconds).
+    """
+    fallback = None
+    for chunk_size in sorted(candidates, reverse=True):
+        inference_time = measure_inference_time(model_handler, chunk_size)
+        if inference_time is None:
+            continue
+        overlap = int(chunk_size * overlap_ratio)
+        hop = chunk_size - overlap
+        # A full hop must be buffered, run through the model and cover the overlap
+        # delay, behind the silence LiveSession plays ahead of the first output
+        latency = (hop + overlap + jitter) / sample_rate + inference_time
+        fallback = (chunk_size, overlap, latency)
+        if latency <= latency_budget and inference_time < hop / sample_rate:
+            return fallback
+    if fallback is None:
+        raise ValueError("The model accepts none of the real-time chunk sizes")
+    return fallback
+
+class LiveSession:
+    """Capture, denoise and play back audio with bounded latency
+
+    The audio callback only moves samples between ring buffers; a worker
+    thread runs the model. stream_factory defaults to sounddevice.Stream and
+    can be replaced by FileStream to run without audio hardware.
+    """
+    def __init__(self, denoiser, sample_rate=Setup.SAMPLE_RATE, blocksize=Setup.REALTIME_BLOCK_SIZE,
+                 jitter=Setup.REALTIME_JITTER_SAMPLES, stream_factory=None):
+        self.denoiser = denoiser
+        self.sample_rate = sample_rate
+        self.blocksize = blocksize
+        self.jitter = jitter
+        self.stream_factory = stream_factory or sd.Stream
+
+        capacity = 4 * (denoiser.chunk_size + blocksize + jitter)
+        self._captured = RingBuffer(capacity)
+        self._playback = RingBuffer(capacity)
+        self._capture_times = deque()
+        self._samples_in = 0
+        self._samples_out = 0
+        self._latencies = deque(maxlen=Setup.REALTIME_STATS_WINDOW)
+        self._ready = threading.Event()
+        self._stats_lock = threading.Lock()  # Counters are updated by the callback and the worker
+        self._running = False
+        self._worker = None
+        self.stream = None
+        self.underruns = 0
+        self.overruns = 0
+
+    def start(self):
+        self._running = True
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+        self.stream = self.stream_factory(
+            samplerate=self.sample_rate,
+            blocksize=self.blocksize,
+            channels=1,
+            dtype='float32',
+            callback=self._callback
+        )
+        self.stream.start()
+
+    def stop(self):
+        self._running = False
+        self._ready.set()
+        if self.stream is not None:
+            self.stream.stop()
+            self.stream.close()
+            self.stream = None
+        if self._worker is not None:
+            self._worker.join(timeout=1.0)
+            self._worker = None
+
+    def _callback(self, indata, outdata, frames, time_info, status):
+        now = time.perf_counter()
+        overflow = self._captured.write(indata[:, 0])
+        if overflow:
+            with self._stats_lock:
+                self.overruns += overflow
+        self._capture_times.append((self._samples_in, now))
+        self._samples_in += frames
+        self._ready.set()
+
+        output = self._playback.read(frames)
+        if len(output) < frames:
+            # Not enough denoised audio yet, play silence for the gap
+            if self._samples_out > 0:
+                self.underruns += 1
+            outdata[:len(output), 0] = output
+            outdata[len(output):, 0] = 0
+        else:
+            outdata[:, 0] = output
+        if len(output):
+            self._record_latency(now)
+            self._samples_out += len(output)
+
+    def _record_latency(self, now):
+        """Time from capturing an input sample to playing its denoised output"""
+        source = self._samples_out - self.denoiser.overlap - self.jitter
+        while len(self._capture_times) > 1 and self._capture_times[1][0] <= source:
+            self._capture_times.popleft()
+        if self._capture_times and self._capture_times[0][0] <= source:
+            start, captured_at = self._capture_times[0]
+            offset = (source - start) / self.sample_rate
+            self._latencies.append(now - captured_at - offset)
+
+    def _run(self):
+        hop = self.denoiser.hop
+        primed = False
+        while self._running:
+            if self._captured.available < hop:
+                self._ready.wait(timeout=0.1)
+                self._ready.clear()
+                continue
+            output = self.denoiser.process_hop(self._captured.read(hop))
+            if not primed:
+                # Silence ahead of the first output gives the model slack on every later hop
+                output = np.concatenate((np.zeros(self.jitter, dtype=np.float32), output))
+                primed = True
+            overflow = self._playback.write(output)
+            if overflow:
+                with self._stats_lock:
+                    self.overruns += overflow
+
+    def stats(self):
+        """Measured end-to-end latency in seconds and buffer health"""
+        latencies = np.array(self._latencies)
+        device_latency = 0.0
+        if self.stream is not None and hasattr(self.stream, 'latency'):
+            device_latency = float(np.sum(self.stream.latency))
+        with self._stats_lock:
+            overruns = self.overruns
+        return {
+            'latency_mean': float(latencies.mean()) + device_latency if len(latencies) else None,
+            'latency_max': float(latencies.max()) + device_latency if len(latencies) else None,
+            'underruns': self.underruns,
+            'overruns': overruns,
+            'samples_in': self._samples_in,
+            'samples_out': self._samples_out,
+        }
+
+class FileStream:
+    """Stand-in for sounddevice.Stream that reads the input from a WAV file
+
+    The callback runs on a thread at real-time pace (or as fast as possible
+    with realtime=False) and the played output is collected in `output`.
+    Input is expected at the session sample rate.
+    """
+    def __init__(self, path, samplerate, blocksize, channels=1, dtype='float32', callback=None,
+                 realtime=True):
+        self.path = path
+        self.samplerate = samplerate
+        self.blocksize = blocksize
+        self.callback = callback
+        self.realtime = realtime
+        self.latency = 0.0
+        self.output = []
+        self._thread = None
+        self._running = False
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        period = self.blocksize / self.samplerate
+        deadline = time.perf_counter()
+        for block in sf.blocks(self.path, blocksize=self.blocksize, dtype='float32',
+                               always_2d=True, fill_value=0):
+            if not self._running:
+                break
+            outdata = np.zeros((self.blocksize, 1), dtype=np.float32)
+            self.callback(block[:, :1], outdata, self.blocksize, None, None)
+            self.output.append(outdata[:, 0].copy())
+            if self.realtime:
+                deadline += period
+                time.sleep(max(0.0, deadline - time.perf_counter()))
+        self._running = False
+
+    def wait(self):
+        """Block until the whole file has been streamed"""
+        if self._thread is not None:
+            self._thread.join()
+
+    def stop(self):
+        self._running = False
+        self.wait()
+
+    def close(self):
+        pass
@@ -0,0 +1,129 @@
+from functools import lru_cache
+from math import gcd
+
+import numpy as np
+
+from setup import Setup
+from lazy_imports import lazy_import
+
+signal = lazy_import("scipy.signal")
+soxr = lazy_import("soxr")
+
+# Quality tiers backed by soxr presets. 'default' is the soxr_hq resampler
+# librosa.resample uses, so results match the previous librosa path.
+SOXR_QUALITIES = {
+    'fast': 'LQ',
+    'default': 'HQ',
+    'high': 'VHQ',
+}
+
+# scipy.signal.resample_poly with its default Kaiser filter
+POLYPHASE_QUALITY = 'polyphase'
+
+QUALITY_TIERS = tuple(SOXR_QUALITIES) + (POLYPHASE_QUALITY,)
+
+@lru_cache(maxsize=None)
+def design_filter(up, down):
+    """Design the polyphase low-pass filter used by scipy.signal.resample_poly, cached per ratio"""
+    max_rate = max(up, down)
+    half_len = 10 * max_rate
+    taps = signal.firwin(2 * half_len + 1, 1. / max_rate, window=('kaiser', 5.0))
+    taps.flags.writeable = False
+    return taps
+
+def reduce_ratio(orig_sr, target_sr):
+    """Return the (up, down) factors for a sample rate pair"""
+    divisor = gcd(int(orig_sr), int(target_sr))
+    return int(target_sr) // divisor, int(orig_sr) // divisor
+
+def _check_quality(quality):
+    if quality not in QUALITY_TIERS:
+        raise ValueError(f"Unknown resampling quality: {quality}")
+
+def resample(samples, orig_sr, target_sr, quality=Setup.RESAMPLE_QUALITY):
+    """Resample a whole signal to target_sr and return float32 samples
+
+    samples is mono or (channels, samples), resampled along the last axis.
+    """
+    _check_quality(quality)
+    if int(orig_sr) == int(target_sr):
+        return samples
+    if quality in SOXR_QUALITIES:
+        # soxr takes channels last
+        return soxr.resample(samples.T, int(orig_sr), int(target_sr), quality=SOXR_QUALITIES[quality]).T
+
+    up, down = reduce_ratio(orig_sr, target_sr)
+    resampled = signal.resample_poly(samples, up, down, window=design_filter(up, down), axis=-1)
+    return resampled.astype(np.float32)
+
+def create_streaming_resampler(orig_sr, target_sr, quality=Setup.RESAMPLE_QUALITY):
+    """Return a block-by-block resampler whose output matches resample()"""
+    _check_quality(quality)
+    if quality in SOXR_QUALITIES:
+        return SoxrStreamingResampler(orig_sr, target_sr, quality)
+    return StreamingResampler(orig_sr, target_sr)
+
+class SoxrStreamingResampler:
+    """soxr resampler that accepts a signal block by block"""
+    def __init__(self, orig_sr, target_sr, quality=Setup.RESAMPLE_QUALITY):
+        self._stream = soxr.ResampleStream(
+            int(orig_sr), int(target_sr), 1, dtype='float32', quality=SOXR_QUALITIES[quality])
+
+    def process(self, block):
+        """Feed a block of input samples and return the output samples now available"""
+        return self._stream.resample_chunk(np.asarray(block, dtype=np.float32))
+
+    def flush(self):
+        """Return the remaining output samples once the input has ended"""
+        return self._stream.resample_chunk(np.zeros(0, dtype=np.float32), last=True)
+
+class StreamingResampler:
+    """Polyphase resampler that accepts a signal block by block
+
+    Concatenating the outputs of process() and flush() gives the same
+    samples as resample() with the 'polyphase' quality on the whole signal.
+    """
+    def __init__(self, orig_sr, target_sr):
+        self.up, self.down = reduce_ratio(orig_sr, target_sr)
+        taps = design_filter(self.up, self.down)
+        half_len = (len(taps) - 1) // 2
+
+        # Same zero padding resample_poly uses to centre the output samples
+        pre_pad = self.down - half_len % self.down
+        self.taps = np.concatenate((np.zeros(pre_pad), taps * self.up))
+        self.pre_remove = (half_len + pre_pad) // self.down
+
+        self._history = np.zeros(0, dtype=np.float64)
+        self._history_start = 0  # Input index of _history[0], a multiple of down
+        self._samples_in = 0
+        self._samples_out = 0
+
+    def process(self, block):
+        """Feed a block of input samples and return the output samples now available"""
+        self._history = np.concatenate((self._history, block))
+        self._samples_in += len(block)
+        last = (self._samples_in * self.up - 1) // self.down - self.pre_remove + 1
+        return self._emit(self._history, last)
+
+    def flush(self):
+        """Return the remaining output samples once the input has ended"""
+        total = -(-self._samples_in * self.up // self.down)
+        tail = np.zeros(len(self.taps) // self.up + self.down + 1)
+        return self._emit(np.concatenate((self._history, tail)), total)
+
+    def _emit(self, history, last):
+        if last <= self._samples_out or not len(history):
+            return np.zeros(0, dtype=np.float32)
+
+        filtered = signal.upfirdn(self.taps, history, self.up, self.down)
+        offset = self._history_start * self.up // self.down - self.pre_remove
+        output = filtered[self._samples_out - offset:last - offset]
+        self._samples_out = last
+
+        # Drop input samples that no later output sample depends on
+        first_needed = max(0, ((last + self.pre_remove) * self.down - len(self.taps)) // self.up + 1)
+        new_start = max(self._history_start, first_needed - first_needed % self.down)
+        self._history = self._history[new_start - self._history_start:]
+        self._history_start = new_start
+
+        return output.astype(np.float32)
@@ -0,0 +1,194 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from setup import Setup
+from instrumentation import count, span
+from model_cache import file_hash
+
+def audio_hash(audio):
+    """SHA-256 of decoded samples, their sample rate and channel count"""
+    digest = hashlib.sha256()
+    digest.update(str(int(audio.sample_rate)).encode())
+    if audio.channels > 1:
+        digest.update(f"channels={audio.channels}".encode())
+    digest.update(np.ascontiguousarray(audio.samples, dtype=np.float32).tobytes())
+    return digest.hexdigest()
+
+def _key(*parts):
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+def model_key(audio_digest, model_id, batching_size, overlap=0, window=Setup.OVERLAP_WINDOW):
+    """Key of the model output for one input and inference configuration"""
+    # The window only matters when chunks overlap
+    return _key('model', audio_digest, model_id, int(batching_size), int(overlap),
+                window if overlap else None)
+
+def filter_key(model_output_key, filter_config, sr):
+    """Key of the post-filter output on top of a cached model output"""
+    return _key('filters', model_output_key, filter_config, int(sr))
+
+class ResultCache:
+    """Two-tier cache of processed audio keyed by content
+
+    An in-memory LRU holds recent results and a directory of .npy files
+    keeps them across runs. Both tiers evict least recently used entries
+    once their byte budget is exceeded. Cached arrays are read-only.
+    A cache_dir of None keeps results in memory only.
+    """
+    def __init__(self, cache_dir=Setup.RESULT_CACHE_DIR, memory_bytes=Setup.RESULT_CACHE_MEMORY_BYTES,
+                 disk_bytes=Setup.RESULT_CACHE_DISK_BYTES):
+        self.cache_dir = cache_dir
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self._memory = OrderedDict()
+        self._memory_used = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + ".npy")
+
+    def get(self, key):
+        """Return the cached array for key, or None"""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                count("result_cache_memory_hits")
+                return self._memory[key]
+
+        with span("result_cache_load"):
+            array = self._load(key)
+        if array is None:
+            self.misses += 1
+            count("result_cache_misses")
+            return None
+        self.hits += 1
+        count("result_cache_disk_hits")
+        self._remember(key, array)
+        return array
+
+    def put(self, key, array):
+        """Store array under key in both tiers and return it marked read-only
+
+        The array is cached without a copy, the caller hands it over.
+        """
+        array = np.asarray(array)
+        array.flags.writeable = False
+        self._remember(key, array)
+        if self.disk_bytes and self.cache_dir:
+            with span("result_cache_store"):
+                self._store(key, array)
+        return array
+
+    def get_or_compute(self, key, compute):
+        """Return the cached result for key, running compute() on a miss"""
+        array = self.get(key)
+        if array is None:
+            array = self.put(key, compute())
+        return array
+
+    def clear_memory(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_used = 0
+
+    def _remember(self, key, array):
+        if array.nbytes > self.memory_bytes:
+            return
+        with self._lock:
+            if key in self._memory:
+                self._memory_used -= self._memory.pop(key).nbytes
+            self._memory[key] = array
+            self._memory_used += array.nbytes
+            while self._memory_used > self.memory_bytes:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_used -= evicted.nbytes
+
+    def _load(self, key):
+        if not self.cache_dir:
+            return None
+        path = self._path(key)
+        try:
+            array = np.load(path, allow_pickle=False)
+            # Mark as recently used for disk eviction
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        array.flags.writeable = False
+        return array
+
+    def _store(self, key, array):
+        """Write atomically, then evict the oldest files beyond the size cap"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix=".tmp-", suffix=".npy")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, array, allow_pickle=False)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            print(f"⚠️ Could not write result cache: {str(e)}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        self._evict_disk()
+
+    def _evict_disk(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".npy") or name.startswith("."):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+
+        used = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if used <= self.disk_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                # Another process evicted it first
+                pass
+            used -= size
+
+    def denoise(self, model_handler, source, filter_chain=None, batching_size=Setup.BATCH_SIZE,
+                overlap=Setup.OVERLAP_SIZE, window=Setup.OVERLAP_WINDOW, tflite_model_path=None,
+                progress=None):
+        """Model output followed by filter_chain, reusing cached results
+
+        The model output is cached separately from the filtered audio, so
+        changing only the filters re-runs the filters but not the model.
+        progress is passed to the model when it has to run.
+        """
+        audio = model_handler.audio_processor.load(source)
+        if tflite_model_path:
+            model_id = f"{file_hash(tflite_model_path)}-tflite"
+            # predict_tflite() doesn't overlap chunks
+            overlap = 0
+            predict = lambda: model_handler.predict_tflite(
+                audio, tflite_model_path, batching_size, progress=progress)
+        else:
+            model_id = model_handler.model_id
+            predict = lambda: model_handler.predict(
+                audio, batching_size, overlap=overlap, window=window, progress=progress)
+
+        with span("hash"):
+            key = model_key(audio_hash(audio), model_id, batching_size, overlap, window)
+        predicted = self.get_or_compute(key, predict)
+        if not filter_chain:
+            return predicted
+
+        sr = model_handler.audio_processor.target_sample_rate
+        key = filter_key(key, filter_chain.to_config(), sr)
+        return self.get_or_compute(key, lambda: filter_chain.apply(predicted, sr))
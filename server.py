@@ -0,0 +1,428 @@
+"""Local HTTP denoising service
+
+    python server.py [--port 8080] [--model model/nocle.hdf5]
+
+POST /denoise with a WAV file, or with raw 16-bit big-endian mono PCM
+(Content-Type: audio/L16; rate=<sample rate>, as in RFC 2586), returns
+the denoised audio at 16 kHz in the same format. GET /metrics returns
+latency, throughput and batching statistics as JSON, GET /health reports
+readiness.
+"""
+import os
+os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')  # Suppress TensorFlow logging
+
+import argparse
+import asyncio
+import io
+import json
+import time
+from collections import deque
+
+import numpy as np
+
+from setup import Setup
+from audio_processor import AudioProcessor
+from lazy_imports import lazy_import
+from resampler import resample
+
+sf = lazy_import("soundfile")
+
+REASONS = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    411: "Length Required", 413: "Payload Too Large", 415: "Unsupported Media Type",
+    500: "Internal Server Error", 503: "Service Unavailable",
+}
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+class ServerBusy(HTTPError):
+    """Backpressure limit reached, the client should retry later"""
+    def __init__(self, message):
+        super().__init__(503, message)
+
+class MicroBatcher:
+    """Merge chunks from concurrent requests into shared forward passes
+
+    The first queued request waits at most max_wait seconds for others to
+    fill the batch up to max_batch_chunks. Only one batch runs at a time,
+    on a worker thread, so the event loop keeps accepting requests.
+    """
+    def __init__(self, model_handler, max_batch_chunks=Setup.SERVER_MAX_BATCH_CHUNKS,
+                 max_wait=Setup.SERVER_MAX_WAIT, max_queued_chunks=Setup.SERVER_MAX_QUEUED_CHUNKS):
+        self.model_handler = model_handler
+        self.max_batch_chunks = max_batch_chunks
+        self.max_wait = max_wait
+        self.max_queued_chunks = max_queued_chunks
+        self._pending = deque()
+        self._queued_chunks = 0
+        self._wakeup = None
+        self._task = None
+        self.batches = 0
+        self.batched_chunks = 0
+        self.batched_requests = 0
+
+    def start(self):
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    @property
+    def queued_chunks(self):
+        return self._queued_chunks
+
+    async def submit(self, chunks):
+        """Denoise (n_chunks, batching_size) chunks as part of a shared batch"""
+        if len(chunks) > self.max_queued_chunks:
+            # Would never fit, retrying can't help
+            raise HTTPError(413, f"Audio needs {len(chunks)} chunks, at most {self.max_queued_chunks} are accepted")
+        if self._queued_chunks + len(chunks) > self.max_queued_chunks:
+            raise ServerBusy(f"{self._queued_chunks} chunks already queued")
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((chunks, future, time.perf_counter()))
+        self._queued_chunks += len(chunks)
+        self._wakeup.set()
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            # Give concurrent requests until the oldest one's deadline to join
+            deadline = self._pending[0][2] + self.max_wait
+            while self._pending_chunks() < self.max_batch_chunks:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+
+            batch = [self._pending.popleft()]
+            size = len(batch[0][0])
+            while self._pending and size + len(self._pending[0][0]) <= self.max_batch_chunks:
+                size += len(self._pending[0][0])
+                batch.append(self._pending.popleft())
+
+            chunks = np.concatenate([item[0] for item in batch]) if len(batch) > 1 else batch[0][0]
+            try:
+                predicted = await loop.run_in_executor(
+                    None, self.model_handler.infer_chunks, chunks, self.max_batch_chunks)
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            else:
+                start = 0
+                for item, future, _ in batch:
+                    if not future.done():
+                        future.set_result(predicted[start:start + len(item)])
+                    start += len(item)
+            finally:
+                self._queued_chunks -= size
+            self.batches += 1
+            self.batched_chunks += size
+            self.batched_requests += len(batch)
+
+    def _pending_chunks(self):
+        return sum(len(item[0]) for item in self._pending)
+
+class Metrics:
+    """Request counters and a sliding window of latencies and audio durations"""
+    def __init__(self, window=Setup.SERVER_METRICS_WINDOW):
+        self.started = time.time()
+        self.requests = 0
+        self.errors = 0
+        self.rejected = 0
+        self.in_flight = 0
+        self.audio_seconds = 0.0
+        self._recent = deque(maxlen=window)  # (finished at, latency, audio seconds)
+
+    def record(self, latency, audio_seconds):
+        self.audio_seconds += audio_seconds
+        self._recent.append((time.perf_counter(), latency, audio_seconds))
+
+    def snapshot(self, batcher):
+        recent = np.array(self._recent) if self._recent else np.zeros((0, 3))
+        latencies = recent[:, 1]
+        span = recent[-1, 0] - recent[0, 0] + recent[0, 1] if len(recent) else 0.0
+
+        def percentile(q):
+            return float(np.percentile(latencies, q)) if len(latencies) else None
+
+        return {
+            'uptime_seconds': time.time() - self.started,
+            'requests': self.requests,
+            'errors': self.errors,
+            'rejected': self.rejected,
+            'in_flight': self.in_flight,
+            'audio_seconds': self.audio_seconds,
+            'latency_p50': percentile(50),
+            'latency_p95': percentile(95),
+            'latency_p99': percentile(99),
+            'latency_max': float(latencies.max()) if len(latencies) else None,
+            # Over the recent window, from the first request's start to the last one's end
+            'requests_per_second': len(recent) / span if span > 0 else None,
+            'audio_seconds_per_second': float(recent[:, 2].sum()) / span if span > 0 else None,
+            'queued_chunks': batcher.queued_chunks,
+            'batches': batcher.batches,
+            'mean_batch_chunks': batcher.batched_chunks / batcher.batches if batcher.batches else None,
+            'mean_batch_requests': batcher.batched_requests / batcher.batches if batcher.batches else None,
+        }
+
+class DenoiseServer:
+    """asyncio HTTP/1.1 server around one loaded ModelHandler"""
+    def __init__(self, model_handler, batching_size=Setup.BATCH_SIZE,
+                 max_concurrent=Setup.SERVER_MAX_CONCURRENT_REQUESTS,
+                 max_body_bytes=Setup.SERVER_MAX_BODY_BYTES, batcher=None):
+        self.model_handler = model_handler
+        self.audio_processor = model_handler.audio_processor
+        self.batching_size = batching_size
+        self.max_concurrent = max_concurrent
+        self.max_body_bytes = max_body_bytes
+        self.batcher = batcher or MicroBatcher(model_handler)
+        self.metrics = Metrics()
+        self._server = None
+        self._connections = set()
+
+    async def start(self, host=Setup.SERVER_HOST, port=Setup.SERVER_PORT):
+        self.batcher.start()
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        return self._server.sockets[0].getsockname()[:2]
+
+    async def serve_forever(self):
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            # Idle keep-alive connections would otherwise hold the server open
+            for writer in list(self._connections):
+                writer.close()
+            await self._server.wait_closed()
+        await self.batcher.stop()
+
+    async def _handle_connection(self, reader, writer):
+        self._connections.add(writer)
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except HTTPError as e:
+                    await self._respond(writer, e.status, self._error_body(e), close=True)
+                    break
+                if request is None:
+                    break
+                method, path, headers, body = request
+                close = headers.get('connection', '').lower() == 'close'
+                status, content_type, payload, extra = await self._dispatch(method, path, headers, body)
+                await self._respond(writer, status, payload, content_type, extra, close)
+                if close:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._connections.discard(writer)
+            writer.close()
+
+    async def _read_request(self, reader):
+        """Parse one request, None when the client closed the connection"""
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError as e:
+            if not e.partial:
+                return None
+            raise HTTPError(400, "Incomplete request")
+        except asyncio.LimitOverrunError:
+            raise HTTPError(400, "Request headers too large")
+
+        lines = head.decode('latin-1').split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            raise HTTPError(400, "Malformed request line")
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+
+        body = b""
+        if method == 'POST':
+            if 'content-length' not in headers:
+                raise HTTPError(411, "Content-Length is required")
+            try:
+                length = int(headers['content-length'])
+            except ValueError:
+                raise HTTPError(400, "Malformed Content-Length")
+            if length < 0:
+                raise HTTPError(400, "Malformed Content-Length")
+            if length > self.max_body_bytes:
+                raise HTTPError(413, f"Body larger than {self.max_body_bytes} bytes")
+            body = await reader.readexactly(length)
+        return method, target, headers, body
+
+    async def _dispatch(self, method, target, headers, body):
+        path, _, query = target.partition("?")
+        if path == '/health':
+            return 200, 'application/json', json.dumps({'status': 'ok'}).encode(), {}
+        if path == '/metrics':
+            snapshot = self.metrics.snapshot(self.batcher)
+            return 200, 'application/json', json.dumps(snapshot, indent=2).encode(), {}
+        if path != '/denoise':
+            return 404, 'application/json', self._error_body(HTTPError(404, "Unknown path")), {}
+        if method != 'POST':
+            return 405, 'application/json', self._error_body(HTTPError(405, "Use POST")), {}
+
+        if self.metrics.in_flight >= self.max_concurrent:
+            self.metrics.rejected += 1
+            return 503, 'application/json', self._error_body(ServerBusy("Too many requests")), \
+                {'Retry-After': '1'}
+
+        self.metrics.requests += 1
+        self.metrics.in_flight += 1
+        start = time.perf_counter()
+        try:
+            content_type, payload, audio_seconds = await self._denoise(headers, query, body)
+            self.metrics.record(time.perf_counter() - start, audio_seconds)
+            return 200, content_type, payload, {}
+        except ServerBusy as e:
+            self.metrics.rejected += 1
+            return 503, 'application/json', self._error_body(e), {'Retry-After': '1'}
+        except HTTPError as e:
+            self.metrics.errors += 1
+            return e.status, 'application/json', self._error_body(e), {}
+        except Exception as e:
+            self.metrics.errors += 1
+            return 500, 'application/json', self._error_body(HTTPError(500, str(e))), {}
+        finally:
+            self.metrics.in_flight -= 1
+
+    async def _denoise(self, headers, query, body):
+        loop = asyncio.get_running_loop()
+        samples, raw = await loop.run_in_executor(None, self._decode, headers, query, body)
+        chunks = self.audio_processor.chunk_audio(samples, self.batching_size)
+        predicted = await self.batcher.submit(chunks)
+        payload = await loop.run_in_executor(None, self._encode, predicted.reshape(-1)[:len(samples)], raw)
+        content_type = f"audio/L16; rate={self.audio_processor.target_sample_rate}" if raw else 'audio/wav'
+        return content_type, payload, len(samples) / self.audio_processor.target_sample_rate
+
+    def _decode(self, headers, query, body):
+        """Samples at the processing rate and whether the body was raw PCM"""
+        content_type = headers.get('content-type', '').lower()
+        if content_type.startswith('audio/l16') or content_type.startswith('application/octet-stream'):
+            rate = self._parameter(content_type, query, 'rate')
+            if not rate:
+                raise HTTPError(400, "Raw PCM needs a positive rate, e.g. Content-Type: audio/L16; rate=16000")
+            if len(body) % 2:
+                raise HTTPError(400, "Raw PCM body must hold whole 16-bit samples")
+            # audio/L16 is in network byte order
+            samples = np.frombuffer(body, dtype='>i2').astype(np.float32) / 32768
+            raw = True
+        elif body[:4] == b"RIFF" or content_type in ('audio/wav', 'audio/x-wav', 'audio/wave'):
+            try:
+                samples, rate = sf.read(io.BytesIO(body), dtype='float32', always_2d=True)
+            except Exception as e:
+                raise HTTPError(400, f"Could not decode WAV: {str(e)}")
+            # First channel, like AudioProcessor.load()
+            samples = samples[:, 0]
+            raw = False
+        else:
+            raise HTTPError(415, "Send audio/wav or audio/L16; rate=<sample rate>")
+
+        if not len(samples):
+            raise HTTPError(400, "Empty audio")
+        target = self.audio_processor.target_sample_rate
+        if int(rate) != target:
+            samples = resample(samples, int(rate), target, self.audio_processor.resample_quality)
+        return np.asarray(samples, dtype=np.float32), raw
+
+    @staticmethod
+    def _parameter(content_type, query, name):
+        for part in content_type.split(";")[1:] + query.split("&"):
+            key, _, value = part.strip().partition("=")
+            if key == name and value.isdigit():
+                return int(value)
+        return None
+
+    def _encode(self, samples, raw):
+        pcm = AudioProcessor.to_pcm16(samples)
+        if raw:
+            return pcm.astype('>i2').tobytes()
+        output = io.BytesIO()
+        sf.write(output, pcm, self.audio_processor.target_sample_rate, format='WAV', subtype='PCM_16')
+        return output.getvalue()
+
+    @staticmethod
+    def _error_body(error):
+        return json.dumps({'error': str(error)}).encode()
+
+    @staticmethod
+    async def _respond(writer, status, payload, content_type='application/json', extra=None, close=False):
+        lines = [
+            f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+            f"Content-Type: {content_type}",
+            f"Content-Length: {len(payload)}",
+            f"Connection: {'close' if close else 'keep-alive'}",
+        ]
+        lines += [f"{name}: {value}" for name, value in (extra or {}).items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode('latin-1') + payload)
+        await writer.drain()
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Serve Nocle denoising over HTTP")
+    parser.add_argument("--host", default=Setup.SERVER_HOST)
+    parser.add_argument("--port", type=int, default=Setup.SERVER_PORT)
+    parser.add_argument("--model", default=Setup.MODEL_PATH, help="Keras model path")
+    parser.add_argument("--artifact", choices=["keras", "savedmodel", "tflite"],
+                        default=Setup.MODEL_ARTIFACT_FORMAT)
+    parser.add_argument("--max-batch-chunks", type=int, default=Setup.SERVER_MAX_BATCH_CHUNKS,
+                        help="Chunks merged into one forward pass")
+    parser.add_argument("--max-wait", type=float, default=Setup.SERVER_MAX_WAIT,
+                        help="Seconds a request waits for others to join its batch")
+    parser.add_argument("--max-queued-chunks", type=int, default=Setup.SERVER_MAX_QUEUED_CHUNKS)
+    parser.add_argument("--max-concurrent", type=int, default=Setup.SERVER_MAX_CONCURRENT_REQUESTS)
+    return parser
+
+async def serve(args):
+    from model_handler import ModelHandler
+
+    model_handler = ModelHandler(args.model, AudioProcessor(), artifact_format=args.artifact)
+    batcher = MicroBatcher(model_handler, args.max_batch_chunks, args.max_wait, args.max_queued_chunks)
+    server = DenoiseServer(model_handler, max_concurrent=args.max_concurrent, batcher=batcher)
+    host, port = await server.start(args.host, args.port)
+    print(f"✅ Serving on http://{host}:{port}/denoise", flush=True)
+    try:
+        await server.serve_forever()
+    finally:
+        await server.close()
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if not os.path.exists(args.model):
+        print(f"❌ Model not found: {args.model}")
+        return 1
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -5,12 +5,71 @@ class Setup:
     # Audio settings
     SAMPLE_RATE = 16000
     BATCH_SIZE = 12000
+    RESAMPLE_QUALITY = 'default'  # 'fast', 'default', 'high' or 'polyphase'
+    KEEP_CHANNELS = False  # Denoise every channel instead of keeping only the first
     
     # Model settings
     MODEL_PATH = os.path.join("model", "nocle.hdf5")
-    MODEL_OPTIMIZER = 'adam'
-    MODEL_LOSS = 'mse'
-    
+    MODEL_ARTIFACT_FORMAT = 'savedmodel'  # 'keras', 'savedmodel' or 'tflite'
+    MODEL_QUANTIZATION = None  # TFLite only: None, 'float16' or 'dynamic'
+    MODEL_CACHE_DIR = os.path.join("model", "cache")
+    MODEL_WARM_UP = True
+
+    # Cache of model and post-filter outputs, keyed by content
+    RESULT_CACHE_DIR = os.path.join("model", "results")
+    RESULT_CACHE_MEMORY_BYTES = 256 * 1024 * 1024
+    RESULT_CACHE_DISK_BYTES = 2 * 1024 * 1024 * 1024
+
+    # Inference settings
+    INFERENCE_BATCH_SIZE = None  # Chunks per forward pass, None picks from available memory
+    INFERENCE_MAX_BATCH_SIZE = 64
+    INFERENCE_BATCH_SIZE_FALLBACK = 16
+    PROGRESS_INTERVAL = 0.25  # Target seconds per forward pass when progress is reported
+    PACK_MAX_CHUNKS = 1024  # Chunks of several files packed into one array by predict_many
+    INFERENCE_MEMORY_FRACTION = 0.25  # Share of available memory used for a batch
+    INFERENCE_BYTES_PER_SAMPLE = 512  # Estimated activation bytes per input sample
+    INFERENCE_WORKERS = 1  # Threads running batches of one file in parallel
+    TF_INTRA_OP_THREADS = None  # Threads inside one TensorFlow op, None keeps the TF default
+    TF_INTER_OP_THREADS = None  # Independent TensorFlow ops run at once, None keeps the TF default
+
+    # TFLite settings
+    TFLITE_NUM_THREADS = None  # Threads per interpreter, None uses the TFLite default
+    TFLITE_POOL_SIZE = 4  # Interpreters kept per model for concurrent files
+
+    # Overlap-add settings
+    OVERLAP_SIZE = 0  # Samples shared by neighbouring chunks, 0 keeps hard boundaries
+    OVERLAP_RANGE = (0, 6000, 500)  # (min, max, step)
+    OVERLAP_WINDOW = 'hann'  # Crossfade shape, 'hann' or 'linear'
+
+    # Streaming settings
+    STREAM_BLOCK_CHUNKS = 64  # Model chunks read from disk per block
+    MAPPED_DTYPE = 'float16'  # Intermediate signals on disk: 'int16', 'float16' or 'float32'
+    MAPPED_DIR = None  # Directory for intermediate signals, None uses the system temp directory
+
+    # Real-time settings
+    REALTIME_CHUNK_SIZE = 12000
+    REALTIME_CHUNK_SIZES = (12000, 8000, 4000, 2000)  # Candidates, largest that fits the budget wins
+    REALTIME_OVERLAP = 1500
+    REALTIME_OVERLAP_RATIO = 0.125  # Overlap used with automatically chosen chunk sizes
+    REALTIME_LATENCY_BUDGET = 1.0  # Seconds from capture to playback
+    REALTIME_BLOCK_SIZE = 1024  # Samples per audio device callback
+    REALTIME_JITTER_SAMPLES = 2048  # Extra playback delay that absorbs inference time
+    REALTIME_STATS_WINDOW = 1000  # Latency measurements kept for statistics
+
+    # Local HTTP service
+    SERVER_HOST = "127.0.0.1"
+    SERVER_PORT = 8080
+    SERVER_MAX_BATCH_CHUNKS = 32  # Chunks merged from concurrent requests into one forward pass
+    SERVER_MAX_WAIT = 0.01  # Seconds the first queued chunk waits for others to join its batch
+    SERVER_MAX_QUEUED_CHUNKS = 1024  # Requests are rejected while this many chunks wait
+    SERVER_MAX_CONCURRENT_REQUESTS = 64
+    SERVER_MAX_BODY_BYTES = 64 * 1024 * 1024
+    SERVER_METRICS_WINDOW = 1000  # Recent requests kept for latency statistics
+
+    # Tracing and profiling
+    TRACE_DIR = "traces"  # Where the GUI writes traces when recording is enabled
+    TRACE_MEMORY_INTERVAL = 0.05  # Seconds between memory samples
+
     # Filter parameters
     WIENER_FILTER_SIZE = 15
     WIENER_FILTER_NOISE_VAR = 0.01
@@ -36,6 +95,21 @@ class Setup:
     SPECTRAL_GATE_THRESHOLD = 1.5  # Multiplier for noise threshold
     SPECTRAL_GATE_N_FFT = 2048
     SPECTRAL_GATE_HOP_LENGTH = 512
+
+    # Streaming spectral gate noise-floor sketch
+    STREAM_GATE_FLOOR_DB = -120.0
+    STREAM_GATE_CEILING_DB = 60.0
+    STREAM_GATE_RESOLUTION_DB = 0.25
+    STREAM_GATE_DECAY = 1.0  # Per-frame weight decay, below 1 lets the noise floor track changes
+
+    # Spectrogram display pyramid
+    SPECTROGRAM_ROWS = 256  # Log-spaced frequency bands
+    SPECTROGRAM_MIN_FREQUENCY = 32.0
+    SPECTROGRAM_MAX_COLUMNS = 4096  # Columns of the precomputed overview level
+    SPECTROGRAM_TILE_COLUMNS = 512  # Columns per zoomed-in tile computed on demand
+    SPECTROGRAM_TILE_CACHE = 64  # Zoomed-in tiles kept per audio
+    SPECTROGRAM_BLOCK_FRAMES = 2048  # STFT frames computed at once
+    SPECTROGRAM_TOP_DB = 80.0
     
     # Window dimensions
     MAIN_WINDOW_SIZE = "800x700"
@@ -0,0 +1,300 @@
+from collections import OrderedDict
+
+import numpy as np
+
+from setup import Setup
+from lazy_imports import lazy_import
+
+librosa = lazy_import("librosa")
+
+class Spectrogram:
+    """STFT of a signal computed once and shared by gating and reconstruction"""
+    def __init__(self, samples, sr=Setup.SAMPLE_RATE, n_fft=Setup.SPECTRAL_GATE_N_FFT,
+                 hop_length=Setup.SPECTRAL_GATE_HOP_LENGTH):
+        self.sr = sr
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.stft = librosa.stft(samples, n_fft=n_fft, hop_length=hop_length)
+        self._magnitude = None
+
+    @property
+    def magnitude(self):
+        """Magnitude of the STFT, computed on first use"""
+        if self._magnitude is None:
+            self._magnitude = np.abs(self.stft)
+        return self._magnitude
+
+    def gate(self, threshold=Setup.SPECTRAL_GATE_THRESHOLD):
+        """Zero bins below threshold times the median magnitude of their frequency, in place
+
+        Each channel of a multi-channel signal gets its own noise floor.
+        """
+        magnitude = self.magnitude
+        noise_thresh = np.median(magnitude, axis=-1, keepdims=True)
+        mask = magnitude > (threshold * noise_thresh)
+        self.stft *= mask
+        magnitude *= mask
+        return self
+
+    def inverse(self, length=None):
+        """Reconstruct the time signal"""
+        return librosa.istft(self.stft, hop_length=self.hop_length, length=length)
+
+class QuantileSketch:
+    """Per-frequency-bin histogram of log magnitudes with constant memory
+
+    Quantiles are interpolated within buckets of `resolution` dB, so the
+    estimate is within half a bucket of the exact value seen so far.
+    """
+    def __init__(self, n_bins, floor_db=Setup.STREAM_GATE_FLOOR_DB, ceiling_db=Setup.STREAM_GATE_CEILING_DB,
+                 resolution=Setup.STREAM_GATE_RESOLUTION_DB, decay=Setup.STREAM_GATE_DECAY):
+        self.floor_db = floor_db
+        self.resolution = resolution
+        self.n_buckets = int(np.ceil((ceiling_db - floor_db) / resolution))
+        self.decay = decay
+        self.counts = np.zeros((n_bins, self.n_buckets), dtype=np.float32)
+        self._offsets = np.arange(n_bins)[:, None] * self.n_buckets
+
+    def update(self, magnitude):
+        """Add (n_bins, n_frames) magnitudes to the histogram"""
+        if self.decay < 1.0:
+            self.counts *= self.decay ** magnitude.shape[1]
+        db = 20 * np.log10(np.maximum(magnitude, 1e-12))
+        buckets = ((db - self.floor_db) / self.resolution).astype(np.int64)
+        np.clip(buckets, 0, self.n_buckets - 1, out=buckets)
+        self.counts += np.bincount(
+            (buckets + self._offsets).ravel(), minlength=self.counts.size
+        ).reshape(self.counts.shape)
+
+    def quantile(self, q=0.5):
+        """Estimated magnitude quantile per bin, shape (n_bins, 1)"""
+        cumulative = np.cumsum(self.counts, axis=1)
+        target = q * cumulative[:, -1:]
+        bucket = np.minimum((cumulative < target).sum(axis=1, keepdims=True), self.n_buckets - 1)
+
+        # Interpolate linearly inside the bucket that crosses the target count
+        count = np.take_along_axis(self.counts, bucket, axis=1)
+        below = np.take_along_axis(cumulative, bucket, axis=1) - count
+        fraction = np.clip((target - below) / np.maximum(count, 1e-12), 0.0, 1.0)
+        db = self.floor_db + (bucket + fraction) * self.resolution
+        return 10 ** (db / 20)
+
+class StreamingSpectralGate:
+    """Spectral gate that processes a stream block by block with constant memory
+
+    Frames match librosa.stft with center=True. The noise threshold per
+    frequency bin is the running median kept in a QuantileSketch instead
+    of the median over the whole file, so the output stays close to
+    AudioFilters.spectral_gating once enough frames have been seen. The
+    threshold is refreshed once per process() call. Output lags the input
+    by up to n_fft samples and has the same total length after flush().
+
+    For a two-pass run, observe() a whole signal into a sketch first and
+    gate it with a second gate holding that sketch and update=False.
+    """
+    def __init__(self, n_fft=Setup.SPECTRAL_GATE_N_FFT, hop_length=Setup.SPECTRAL_GATE_HOP_LENGTH,
+                 threshold=Setup.SPECTRAL_GATE_THRESHOLD, quantile=0.5, sketch=None, update=True):
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.threshold = threshold
+        self.quantile = quantile
+        self.sketch = sketch or QuantileSketch(n_fft // 2 + 1)
+        self.update = update
+
+        self._window = np.hanning(n_fft + 1)[:-1].astype(np.float32)
+        self._window_sq = self._window ** 2
+
+        # Centre the first frame like librosa.stft(center=True)
+        self._input = np.zeros(n_fft // 2, dtype=np.float32)
+        # Overlap-add accumulators for the signal and the squared window
+        self._pending = np.zeros(n_fft - hop_length, dtype=np.float32)
+        self._pending_norm = np.zeros(n_fft - hop_length, dtype=np.float32)
+        self._skip = n_fft // 2
+        self._samples_in = 0
+        self._samples_out = 0
+
+    def process(self, block):
+        """Feed a block of samples and return the gated samples now complete"""
+        self._input = np.concatenate((self._input, np.asarray(block, dtype=np.float32)))
+        self._samples_in += len(block)
+        return self._emit(self._run_frames())
+
+    def observe(self, block=None):
+        """Add the frames of a block to the sketch without gating, None ends the signal"""
+        if block is None:
+            block = np.zeros(self.n_fft // 2, dtype=np.float32)
+        self._input = np.concatenate((self._input, np.asarray(block, dtype=np.float32)))
+        n_frames = (len(self._input) - self.n_fft) // self.hop_length + 1
+        if n_frames > 0:
+            self.sketch.update(np.abs(np.fft.rfft(self._frames(n_frames) * self._window, axis=1)).T)
+            self._input = self._input[n_frames * self.hop_length:]
+
+    def flush(self):
+        """Return the remaining gated samples once the stream has ended"""
+        self._input = np.concatenate((self._input, np.zeros(self.n_fft // 2, dtype=np.float32)))
+        done = self._run_frames()
+        return self._emit(np.concatenate((done, self._normalize(self._pending, self._pending_norm))))
+
+    def _emit(self, output):
+        # Drop the centring padding and anything past the end of the input
+        skip = min(self._skip, len(output))
+        self._skip -= skip
+        output = output[skip:self._samples_in - self._samples_out + skip]
+        self._samples_out += len(output)
+        return output
+
+    @staticmethod
+    def _normalize(signal, norm):
+        return signal / np.where(norm > 1e-8, norm, 1.0)
+
+    def _overlap_add(self, frames, pending):
+        """Add (n_frames, n_fft) frames spaced by the hop onto the pending tail"""
+        n_frames = len(frames)
+        accumulated = np.zeros((n_frames - 1) * self.hop_length + self.n_fft, dtype=np.float32)
+        accumulated[:len(pending)] = pending
+        for j in range(self.n_fft // self.hop_length):
+            segment = frames[:, j * self.hop_length:(j + 1) * self.hop_length]
+            target = accumulated[j * self.hop_length:(j + n_frames) * self.hop_length]
+            target.reshape(n_frames, self.hop_length)[:] += segment
+        return accumulated
+
+    def _frames(self, n_frames):
+        return np.lib.stride_tricks.as_strided(
+            self._input,
+            shape=(n_frames, self.n_fft),
+            strides=(self.hop_length * self._input.itemsize, self._input.itemsize),
+            writeable=False
+        )
+
+    def _run_frames(self):
+        n_frames = (len(self._input) - self.n_fft) // self.hop_length + 1
+        if n_frames <= 0:
+            return np.zeros(0, dtype=np.float32)
+
+        spectrum = np.fft.rfft(self._frames(n_frames) * self._window, axis=1).T
+        magnitude = np.abs(spectrum)
+        if self.update:
+            self.sketch.update(magnitude)
+        spectrum *= magnitude > (self.threshold * self.sketch.quantile(self.quantile))
+        gated = np.fft.irfft(spectrum.T, n=self.n_fft, axis=1).astype(np.float32) * self._window
+
+        accumulated = self._overlap_add(gated, self._pending)
+        norm = self._overlap_add(np.broadcast_to(self._window_sq, gated.shape), self._pending_norm)
+
+        # Samples before the next frame start receive no further contributions
+        done = n_frames * self.hop_length
+        self._pending, self._pending_norm = accumulated[done:], norm[done:]
+        self._input = self._input[done:]
+        return self._normalize(accumulated[:done], norm[:done])
+
+class SpectrogramPyramid:
+    """Multi-resolution spectrogram for drawing long signals
+
+    Level k has one column per 2**k STFT frames holding the peak magnitude
+    in each log-spaced frequency band. Levels from `base` up, where the
+    whole signal fits in SPECTROGRAM_MAX_COLUMNS, are built in one
+    block-wise pass. Finer levels are computed tile by tile from the
+    samples when a zoomed-in view needs them and kept in a small LRU.
+    """
+    def __init__(self, samples, sr=Setup.SAMPLE_RATE, n_fft=Setup.SPECTRAL_GATE_N_FFT,
+                 hop_length=Setup.SPECTRAL_GATE_HOP_LENGTH, rows=Setup.SPECTROGRAM_ROWS,
+                 min_frequency=Setup.SPECTROGRAM_MIN_FREQUENCY, max_columns=Setup.SPECTROGRAM_MAX_COLUMNS,
+                 tile_columns=Setup.SPECTROGRAM_TILE_COLUMNS, tile_cache=Setup.SPECTROGRAM_TILE_CACHE,
+                 top_db=Setup.SPECTROGRAM_TOP_DB):
+        self.samples = np.asarray(samples, dtype=np.float32)
+        self.sr = sr
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.tile_columns = tile_columns
+        self.tile_cache = tile_cache
+        self.top_db = top_db
+        # Frame count of librosa.stft(center=True)
+        self.n_frames = 1 + len(self.samples) // hop_length
+        self.duration = len(self.samples) / sr
+
+        # Band edges in Hz and the first FFT bin of every band
+        self.band_edges = np.geomspace(min_frequency, sr / 2, rows + 1)
+        bin_frequencies = np.arange(n_fft // 2 + 1) * sr / n_fft
+        self._band_starts = np.minimum(np.searchsorted(bin_frequencies, self.band_edges[:-1]),
+                                       n_fft // 2)
+
+        self.base = 0
+        while -(-self.n_frames // 2 ** self.base) > max_columns:
+            self.base += 1
+        self.levels = {self.base: self._compute(0, self.n_frames, self.base)}
+        while self.levels[max(self.levels)].shape[1] > 1:
+            top = max(self.levels)
+            self.levels[top + 1] = self._pool(self.levels[top], 2)
+        self.reference = max(float(self.levels[self.base].max()), 1e-10)
+        self._tiles = OrderedDict()
+
+    @staticmethod
+    def _pool(magnitude, factor):
+        """Peak over groups of `factor` columns, the last group may be shorter"""
+        return np.maximum.reduceat(magnitude, np.arange(0, magnitude.shape[1], factor), axis=1)
+
+    def _band_magnitude(self, start, stop):
+        """Band peak magnitudes of STFT frames [start, stop)"""
+        # Frame f is centred on sample f * hop_length, pad with zeros past the edges
+        first = start * self.hop_length - self.n_fft // 2
+        last = (stop - 1) * self.hop_length + self.n_fft // 2 + self.n_fft % 2
+        segment = np.zeros(last - first, dtype=np.float32)
+        lo, hi = max(first, 0), min(last, len(self.samples))
+        segment[lo - first:hi - first] = self.samples[lo:hi]
+        stft = librosa.stft(segment, n_fft=self.n_fft, hop_length=self.hop_length, center=False)
+        return np.maximum.reduceat(np.abs(stft), self._band_starts, axis=0)
+
+    def _compute(self, start, stop, level):
+        """Level `level` columns for frames [start, stop), start aligned to the level"""
+        factor = 2 ** level
+        block = max(factor, Setup.SPECTROGRAM_BLOCK_FRAMES // factor * factor)
+        columns = []
+        for block_start in range(start, stop, block):
+            block_stop = min(block_start + block, stop)
+            columns.append(self._pool(self._band_magnitude(block_start, block_stop), factor))
+        return np.concatenate(columns, axis=1)
+
+    def _tile(self, level, index):
+        key = (level, index)
+        if key in self._tiles:
+            self._tiles.move_to_end(key)
+            return self._tiles[key]
+        frames = self.tile_columns * 2 ** level
+        tile = self._compute(index * frames, min((index + 1) * frames, self.n_frames), level)
+        self._tiles[key] = tile
+        if len(self._tiles) > self.tile_cache:
+            self._tiles.popitem(last=False)
+        return tile
+
+    def level_for(self, start_time, end_time, width):
+        """Finest level with at most `width` columns between the two times"""
+        frames = max(1.0, (end_time - start_time) * self.sr / self.hop_length)
+        level = int(np.ceil(np.log2(max(frames / max(width, 1), 1.0))))
+        return min(level, max(self.levels))
+
+    def view(self, start_time, end_time, width):
+        """Image in dB for a time range drawn `width` pixels wide
+
+        Returns (image of shape (rows, columns), column edges in seconds,
+        band edges in Hz). Only the columns covering the range are built.
+        """
+        level = self.level_for(start_time, end_time, width)
+        factor = 2 ** level
+        n_columns = -(-self.n_frames // factor)
+        frame_time = self.hop_length / self.sr
+        first = int(np.clip(np.floor(start_time / frame_time / factor), 0, n_columns - 1))
+        last = int(np.clip(np.ceil(end_time / frame_time / factor), first + 1, n_columns))
+
+        if level >= self.base:
+            magnitude = self.levels[level][:, first:last]
+        else:
+            tiles = range(first // self.tile_columns, (last - 1) // self.tile_columns + 1)
+            magnitude = np.concatenate([self._tile(level, t) for t in tiles], axis=1)
+            offset = tiles[0] * self.tile_columns
+            magnitude = magnitude[:, first - offset:last - offset]
+
+        image = 20 * np.log10(np.maximum(magnitude, 1e-10) / self.reference)
+        np.maximum(image, -self.top_db, out=image)
+        # Column c is centred on frame c * factor like librosa.display
+        edges = (np.arange(first, last + 1) * factor - 0.5) * frame_time
+        return image, np.clip(edges, 0, None), self.band_edges
@@ -0,0 +1,78 @@
+class SpectrogramPlot:
+    """Draw a SpectrogramPyramid on matplotlib axes and refine it on zoom and pan
+
+    Only the level matching the visible pixel width is drawn, for the
+    visible time range. The colour scale is fixed to [-top_db, 0] dB so a
+    single colorbar stays valid across redraws.
+    """
+    def __init__(self, ax, schedule=None, cmap='magma'):
+        self.ax = ax
+        self.cmap = cmap
+        self.pyramid = None
+        self.mesh = None
+        self.colorbar = None
+        self._norm = None
+        # schedule(callback) coalesces refreshes, e.g. Tk's after_idle
+        self._schedule = schedule
+        self._pending = False
+        self._drawing = False
+        ax.callbacks.connect('xlim_changed', self._on_xlim_changed)
+
+    def show(self, pyramid, title='Spectrogram'):
+        """Draw a new signal zoomed out to its full length"""
+        self.pyramid = pyramid
+        self._drawing = True
+        try:
+            self.ax.set_title(title)
+            self.ax.set_xlabel('Time (s)')
+            self.ax.set_ylabel('Hz')
+            self.ax.set_yscale('log')
+            self.ax.set_xlim(0, pyramid.duration)
+            self.ax.set_ylim(pyramid.band_edges[0], pyramid.band_edges[-1])
+        finally:
+            self._drawing = False
+        self.refresh()
+
+    def refresh(self):
+        """Redraw the visible time range at the matching resolution"""
+        self._pending = False
+        if self.pyramid is None:
+            return
+        start, end = self.ax.get_xlim()
+        start, end = max(start, 0.0), min(end, self.pyramid.duration)
+        if end <= start:
+            return
+        width = self.ax.get_window_extent().width
+        image, time_edges, band_edges = self.pyramid.view(start, end, width)
+
+        self._drawing = True
+        try:
+            xlim, ylim = self.ax.get_xlim(), self.ax.get_ylim()
+            if self.mesh is not None:
+                self.mesh.remove()
+            if self._norm is None:
+                from matplotlib.colors import Normalize
+                # One norm shared by every mesh keeps the colorbar and its labels
+                self._norm = Normalize(vmin=-self.pyramid.top_db, vmax=0)
+            self.mesh = self.ax.pcolormesh(time_edges, band_edges, image, shading='flat', cmap=self.cmap,
+                                           norm=self._norm)
+            # Keep the user's view instead of autoscaling to the new mesh
+            self.ax.set_xlim(xlim)
+            self.ax.set_ylim(ylim)
+        finally:
+            self._drawing = False
+
+        if self.colorbar is None:
+            self.colorbar = self.ax.figure.colorbar(self.mesh, ax=self.ax, format="%+2.f dB")
+        else:
+            self.colorbar.update_normal(self.mesh)
+        self.ax.figure.canvas.draw_idle()
+
+    def _on_xlim_changed(self, ax):
+        if self._drawing or self._pending:
+            return
+        if self._schedule is None:
+            self.refresh()
+        else:
+            self._pending = True
+            self._schedule(self.refresh)
@@ -0,0 +1,37 @@
+from audio_processor import AudioProcessor
+from setup import Setup
+
+class StreamingDenoiser:
+    """Denoise WAV files block by block so memory stays bounded
+
+    Blocks are whole multiples of the model chunk size and resampling carries
+    its filter state, so the output is sample-identical to ModelHandler.predict
+    at every resampling quality.
+
+    An optional StreamingSpectralGate is applied to the denoised blocks.
+    """
+    def __init__(self, model_handler, batching_size=Setup.BATCH_SIZE,
+                 block_chunks=Setup.STREAM_BLOCK_CHUNKS, spectral_gate=None):
+        self.model_handler = model_handler
+        self.audio_processor = model_handler.audio_processor
+        self.batching_size = batching_size
+        self.block_size = batching_size * block_chunks
+        self.spectral_gate = spectral_gate
+
+    def process(self, input_path, output_path, inference_batch_size=None):
+        """Denoise input_path into output_path and return the samples written"""
+        written = 0
+        with self.audio_processor.open_writer(output_path) as writer:
+            for block in self.audio_processor.iter_blocks(input_path, self.block_size):
+                chunks = AudioProcessor.chunk_audio(block, self.batching_size)
+                predicted = self.model_handler.infer_chunks(chunks, inference_batch_size)
+                predicted = predicted.reshape(-1)[:len(block)]
+                if self.spectral_gate is not None:
+                    predicted = self.spectral_gate.process(predicted)
+                writer.write(AudioProcessor.to_pcm16(predicted))
+                written += len(predicted)
+            if self.spectral_gate is not None:
+                tail = self.spectral_gate.flush()
+                writer.write(AudioProcessor.to_pcm16(tail))
+                written += len(tail)
+        return written
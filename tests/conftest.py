@@ -0,0 +1,15 @@
+import os
+import sys
+
+import pytest
+
+# Modules live at the repository root, the stand-in model in benchmarks/
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+@pytest.fixture(scope="session")
+def tiny_model(tmp_path_factory):
+    """Path of a small Keras model with the denoiser's input and output shape"""
+    from suite import build_tiny_model
+    return build_tiny_model(str(tmp_path_factory.mktemp("model") / "tiny.hdf5"))
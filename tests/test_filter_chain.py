@@ -0,0 +1,69 @@
+import json
+
+import numpy as np
+import pytest
+
+from filter_chain import FilterChain, FilterStage, FusedGateExpansion
+from filters import AudioFilters
+
+SR = 16000
+
+@pytest.fixture
+def audio():
+    return np.random.default_rng(0).uniform(-0.6, 0.6, 20000).astype(np.float32)
+
+@pytest.mark.parametrize("gate, expansion", [
+    ({}, {}),
+    ({'threshold': 0.05}, {'threshold': 0.2, 'ratio': 1.5}),
+    ({'threshold': 0.3}, {'threshold': 0.1}),
+])
+def test_fused_gate_expansion_matches_separate_stages(audio, gate, expansion):
+    chain = FilterChain([FilterStage('noise_gate', **gate), FilterStage('dynamic_expansion', **expansion)])
+    steps = chain.compile()
+    assert len(steps) == 1 and isinstance(steps[0], FusedGateExpansion)
+    separate = AudioFilters.dynamic_expansion(AudioFilters.noise_gate(audio, **gate), **expansion)
+    np.testing.assert_array_equal(chain.apply(audio, SR), separate)
+
+def test_fused_gate_expansion_keeps_channel_balance(audio):
+    stereo = np.stack((audio, 0.5 * audio))
+    chain = FilterChain([FilterStage('noise_gate'), FilterStage('dynamic_expansion')])
+    separate = AudioFilters.dynamic_expansion(AudioFilters.noise_gate(stereo))
+    np.testing.assert_array_equal(chain.apply(stereo, SR), separate)
+
+def test_only_adjacent_gate_and_expansion_fuse():
+    chain = FilterChain.from_config(['noise_gate', 'gaussian_blur', 'dynamic_expansion',
+                                     'noise_gate', 'dynamic_expansion', 'dynamic_expansion'])
+    names = [step.name for step in chain.compile()]
+    assert names == ['noise_gate', 'gaussian_blur', 'dynamic_expansion',
+                     'noise_gate+dynamic_expansion', 'dynamic_expansion']
+
+def test_default_chain_matches_stage_by_stage(audio):
+    expected = audio
+    for stage in FilterChain.default().stages:
+        expected = stage(expected, SR)
+    np.testing.assert_array_equal(AudioFilters.apply_all_filters(audio, SR), expected)
+
+def test_from_config_accepts_names_and_params():
+    chain = FilterChain.from_config({'filters': [{'name': 'wiener_filter', 'mysize': 9}, 'noise_gate']})
+    assert [stage.name for stage in chain.stages] == ['wiener_filter', 'noise_gate']
+    assert chain.stages[0].params == {'mysize': 9}
+    assert chain.stages[1].params == {}
+    assert FilterChain.from_config([]).to_config() == []
+
+def test_from_config_rejects_unknown_stage():
+    with pytest.raises(ValueError):
+        FilterChain.from_config(['echo'])
+
+def test_save_and_load_round_trip(tmp_path):
+    path = str(tmp_path / "chain.json")
+    chain = FilterChain([FilterStage('gaussian_blur', sigma=2.0), FilterStage('noise_gate', threshold=0.02)])
+    chain.save(path)
+    with open(path) as f:
+        assert json.load(f) == {'filters': chain.to_config()}
+    assert FilterChain.load(path).to_config() == chain.to_config()
+
+def test_from_selection_dynamics_adds_dynamics_stages():
+    chain = FilterChain.from_selection(wiener=True, dynamics=True)
+    assert [stage.name for stage in chain.stages] == [
+        'wiener_filter', 'noise_gate', 'dynamic_expansion', 'exponential_smooth']
+    assert len(FilterChain.from_selection()) == 0
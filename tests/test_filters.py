@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from filters import AudioFilters
+from setup import Setup
+
+def smooth_loop(data, alpha=Setup.EXPONENTIAL_SMOOTH_ALPHA):
+    """Per-sample loop exponential_smooth() replaced"""
+    smoothed = np.zeros_like(data)
+    smoothed[0] = data[0]
+    for t in range(1, len(data)):
+        smoothed[t] = alpha * data[t] + (1 - alpha) * smoothed[t-1]
+    return smoothed
+
+@pytest.fixture
+def signal():
+    return np.random.default_rng(0).uniform(-1, 1, 20000).astype(np.float32)
+
+@pytest.mark.parametrize("alpha", [Setup.EXPONENTIAL_SMOOTH_ALPHA, 0.01, 0.9])
+def test_exponential_smooth_matches_loop(signal, alpha):
+    np.testing.assert_array_equal(AudioFilters.exponential_smooth(signal, alpha), smooth_loop(signal, alpha))
+
+@pytest.mark.parametrize("sizes", [[20000], [1, 19999], [4096, 4096, 1000, 10808], [7] * 2857 + [1]])
+def test_exponential_smooth_chunks_carry_state(signal, sizes):
+    chunks = np.split(signal, np.cumsum(sizes)[:-1])
+    previous = None
+    outputs = []
+    for chunk in chunks + [signal[:0]]:
+        smoothed, previous = AudioFilters.exponential_smooth_chunk(chunk, previous=previous)
+        outputs.append(smoothed)
+    np.testing.assert_array_equal(np.concatenate(outputs), AudioFilters.exponential_smooth(signal))
+
+def test_exponential_smooth_channels_are_independent(signal):
+    stereo = np.stack((signal, signal[::-1]))
+    smoothed = AudioFilters.exponential_smooth(stereo)
+    np.testing.assert_array_equal(smoothed[0], AudioFilters.exponential_smooth(signal))
+    np.testing.assert_array_equal(smoothed[1], AudioFilters.exponential_smooth(signal[::-1].copy()))
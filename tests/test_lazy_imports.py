@@ -0,0 +1,26 @@
+import sys
+import threading
+
+from lazy_imports import is_loaded, lazy_import
+
+def test_loads_on_first_use():
+    json = lazy_import("json")
+    assert json.dumps([1]) == "[1]"
+    assert is_loaded(json)
+    assert json._module is sys.modules["json"]
+
+def test_concurrent_first_use_gives_one_module():
+    module = lazy_import("xml.dom.minidom")
+    results = []
+    barrier = threading.Barrier(8)
+
+    def use():
+        barrier.wait()
+        results.append(module.parseString)
+
+    threads = [threading.Thread(target=use) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(id(function) for function in results)) == 1
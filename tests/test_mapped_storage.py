@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from audio_processor import AudioProcessor
+from filter_chain import FilterChain
+from mapped_storage import MappedPipeline, MappedSignal
+from setup import Setup
+
+CHAINS = {
+    # Windowed filters read a halo across block boundaries
+    'windowed': ['wiener_filter', {'name': 'gaussian_blur', 'sigma': 3.0}],
+    # Fused gate and expansion, then IIR smoothing carrying state across blocks
+    'dynamics': ['noise_gate', 'dynamic_expansion', 'exponential_smooth'],
+    'all': ['wiener_filter', 'gaussian_blur', 'dynamic_expansion', 'exponential_smooth',
+            'noise_gate', {'name': 'wiener_filter', 'mysize': 31}],
+}
+
+@pytest.fixture(scope="module")
+def model_handler(tiny_model):
+    from model_handler import ModelHandler
+    return ModelHandler(tiny_model, AudioProcessor(), artifact_format='keras')
+
+@pytest.fixture(scope="module")
+def wav_path(tmp_path_factory):
+    import soundfile as sf
+    rng = np.random.default_rng(0)
+    t = np.arange(int(5.3 * Setup.SAMPLE_RATE)) / Setup.SAMPLE_RATE
+    samples = 0.4 * np.sin(2 * np.pi * 330 * t) * np.sin(2 * np.pi * 0.7 * t) + 0.05 * rng.standard_normal(len(t))
+    path = str(tmp_path_factory.mktemp("mapped") / "input.wav")
+    sf.write(path, samples.astype(np.float32), Setup.SAMPLE_RATE, subtype='PCM_16')
+    return path
+
+def run_mapped(model_handler, wav_path, chain, dtype, tmp_path):
+    import soundfile as sf
+    # Two chunks per block, so every filter crosses several block boundaries
+    pipeline = MappedPipeline(model_handler, chain, dtype=dtype, block_chunks=2, directory=str(tmp_path))
+    output_path = str(tmp_path / "output.wav")
+    written = pipeline.process(wav_path, output_path)
+    output, _ = sf.read(output_path, dtype='int16')
+    assert written == len(output)
+    return output
+
+def in_memory(model_handler, wav_path, chain, storage_dtype=None):
+    """In-memory result, optionally rounding every stage output like mapped storage does"""
+    audio = model_handler.predict(wav_path, Setup.BATCH_SIZE, overlap=0)
+    for step in chain.compile():
+        audio = step(audio, Setup.SAMPLE_RATE)
+        if storage_dtype is not None:
+            audio = audio.astype(storage_dtype)
+    return AudioProcessor.to_pcm16(audio).astype(np.int32)
+
+@pytest.mark.parametrize("chain", CHAINS)
+def test_float32_storage_matches_in_memory(model_handler, wav_path, tmp_path, chain):
+    chain = FilterChain.from_config(CHAINS[chain])
+    output = run_mapped(model_handler, wav_path, chain, 'float32', tmp_path).astype(np.int32)
+    np.testing.assert_array_equal(output, in_memory(model_handler, wav_path, chain, np.float32))
+    # signal.wiener returns float64, rounding it to float32 moves at most one output step
+    assert np.abs(output - in_memory(model_handler, wav_path, chain)).max() <= 1
+
+@pytest.mark.parametrize("dtype, steps", [('float16', 32), ('int16', 4)])
+@pytest.mark.parametrize("chain", CHAINS)
+def test_compact_storage_is_close_to_in_memory(model_handler, wav_path, tmp_path, chain, dtype, steps):
+    chain = FilterChain.from_config(CHAINS[chain])
+    expected = in_memory(model_handler, wav_path, chain, np.float32)
+    output = run_mapped(model_handler, wav_path, chain, dtype, tmp_path).astype(np.int32)
+    assert len(output) == len(expected)
+    difference = np.abs(output - expected)
+    # Samples rounded across the gate or expansion threshold jump, so bound
+    # the bulk of the output in 16-bit steps and the overall error
+    assert np.percentile(difference, 99) <= steps
+    assert np.sqrt(np.mean(difference ** 2.0)) < 0.01 * np.sqrt(np.mean(expected ** 2.0))
+
+def test_mapped_signal_round_trip(tmp_path):
+    samples = np.random.default_rng(0).uniform(-1, 1, 10000).astype(np.float32)
+    for dtype, atol in (('float32', 0), ('float16', 1e-3), ('int16', 1 / 32768)):
+        signal = MappedSignal.from_blocks(str(tmp_path / dtype), np.array_split(samples, 7), dtype)
+        assert len(signal) == len(samples)
+        read = np.concatenate([block for _, block in signal.blocks(3000)])
+        np.testing.assert_allclose(read, samples, rtol=0, atol=atol)
@@ -0,0 +1,62 @@
+import time
+
+import numpy as np
+import pytest
+
+from model_handler import InterpreterPool, _batches
+from setup import Setup
+
+def test_batches_without_progress_are_fixed():
+    assert list(_batches(10, 4)) == [(0, 4), (4, 8), (8, 10)]
+
+def test_timed_batches_grow_to_the_progress_interval():
+    per_chunk = Setup.PROGRESS_INTERVAL / 20
+    sizes = []
+    for start, stop in _batches(100, 64, timed=True):
+        time.sleep(per_chunk * (stop - start))
+        sizes.append(stop - start)
+    assert sizes[0] == 1
+    # Largest power of two that fits the interval, stable between passes
+    assert set(sizes[1:-1]) == {16}
+    assert sum(sizes) == 100
+
+def test_timed_batches_stop_at_step():
+    sizes = [stop - start for start, stop in _batches(100, 8, timed=True)]
+    assert sizes[0] == 1
+    assert max(sizes) == 8
+
+def test_interpreter_pool_frees_slot_when_creation_fails(tmp_path):
+    pool = InterpreterPool(str(tmp_path / "missing.tflite"), size=1)
+    for _ in range(2):
+        # A leaked slot would make the second attempt block on the idle queue
+        with pytest.raises(ValueError):
+            with pool.acquire():
+                pass
+    assert pool._created == 0
+
+@pytest.fixture(scope="module")
+def model_handler(tiny_model):
+    from audio_processor import AudioProcessor
+    from model_handler import ModelHandler
+    return ModelHandler(tiny_model, AudioProcessor(), artifact_format='keras')
+
+@pytest.fixture(scope="module")
+def clips():
+    rng = np.random.default_rng(0)
+    # Shorter than one chunk, exactly one chunk, and with max_chunks=4 below:
+    # one that pushes its group over the limit and one longer than the limit
+    lengths = [500, 12000, 30001, 7, 25000, 61000, 11999]
+    return [rng.uniform(-0.5, 0.5, length).astype(np.float32) for length in lengths]
+
+@pytest.mark.parametrize("overlap", [0, 1000])
+def test_predict_many_matches_predict(model_handler, clips, overlap):
+    expected = [model_handler.predict(clip, overlap=overlap, inference_batch_size=3) for clip in clips]
+    packed = model_handler.predict_many(clips, overlap=overlap, inference_batch_size=3, max_chunks=4)
+    assert len(packed) == len(clips)
+    for clip, output, reference in zip(clips, packed, expected):
+        assert len(output) == len(clip)
+        np.testing.assert_array_equal(output, reference)
+
+def test_iter_predict_many_yields_in_order(model_handler, clips):
+    indices = [index for index, _ in model_handler.iter_predict_many(clips, overlap=0, max_chunks=4)]
+    assert indices == list(range(len(clips)))
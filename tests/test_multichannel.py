@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from audio_processor import AudioProcessor, DecodedAudio
+from filter_chain import FilterStage
+
+SR = 16000
+
+@pytest.fixture
+def stereo():
+    rng = np.random.default_rng(0)
+    return rng.uniform(-0.5, 0.5, (2, SR * 10)).astype(np.float32)
+
+def test_stereo_duration(stereo):
+    audio = DecodedAudio(stereo, SR, SR)
+    assert audio.channels == 2
+    assert len(audio) == SR * 10
+    assert audio.duration == pytest.approx(10.0)
+
+def test_mono_duration():
+    audio = DecodedAudio(np.zeros(SR * 3, dtype=np.float32), SR, SR)
+    assert audio.channels == 1
+    assert audio.duration == pytest.approx(3.0)
+
+def test_load_keeps_array_channels(stereo):
+    audio = AudioProcessor().load(stereo)
+    assert audio.samples.shape == stereo.shape
+    assert AudioProcessor().load(stereo[:1]).samples.ndim == 1
+
+def test_chunks_round_trip_per_channel(stereo):
+    samples = stereo[:, :25000]
+    chunks = AudioProcessor.chunk_audio(samples, 12000)
+    assert chunks.shape == (6, 12000)
+    np.testing.assert_array_equal(chunks[:3].reshape(-1)[:25000], samples[0])
+    np.testing.assert_array_equal(AudioProcessor.unchunk(chunks, 25000, channels=2), samples)
+
+def test_overlap_add_per_channel(stereo):
+    samples = stereo[:, :30000]
+    frames = AudioProcessor.frame_audio(samples, 12000, 1000)
+    output = AudioProcessor.overlap_add(frames.copy(), 30000, 1000, channels=2)
+    np.testing.assert_allclose(output, samples, atol=1e-6)
+
+@pytest.mark.parametrize("name", ["wiener_filter", "gaussian_blur", "noise_gate", "exponential_smooth"])
+def test_filters_match_each_channel(stereo, name):
+    stage = FilterStage(name)
+    output = stage(stereo, SR)
+    for channel in range(2):
+        np.testing.assert_allclose(output[channel], stage(np.ascontiguousarray(stereo[channel]), SR),
+                                   rtol=1e-5, atol=1e-6)
+
+def test_dynamic_expansion_keeps_channel_balance(stereo):
+    stereo[1] *= 0.5
+    output = FilterStage('dynamic_expansion')(stereo, SR)
+    assert np.abs(output).max() == pytest.approx(1.0)
+    assert np.abs(output[1]).max() < np.abs(output[0]).max()
+
+def test_save_audio_writes_all_channels(stereo, tmp_path):
+    import soundfile as sf
+    path = str(tmp_path / "stereo.wav")
+    AudioProcessor().save_audio(stereo, path)
+    written, sample_rate = sf.read(path, dtype='float32', always_2d=True)
+    assert sample_rate == SR
+    assert written.shape == (stereo.shape[1], 2)
+    np.testing.assert_allclose(written.T, stereo, atol=1 / 32768)
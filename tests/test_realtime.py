@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+
+from audio_processor import AudioProcessor
+from realtime import FileStream, LiveSession, RealtimeDenoiser, RingBuffer, choose_chunk_size
+
+SR = 16000
+CHUNK_SIZE = 2000
+OVERLAP = 250
+BLOCKSIZE = 256
+JITTER = 1024
+
+class CenteringModel:
+    """Removes each chunk's mean, so the output depends on chunk boundaries"""
+    def infer_chunks(self, chunks, batch_size=None):
+        return chunks - chunks.mean(axis=1, keepdims=True)
+
+@pytest.fixture
+def signal():
+    rng = np.random.default_rng(0)
+    t = np.arange(SR) / SR
+    return (0.3 * np.sin(2 * np.pi * 220 * t) + 0.05 * rng.standard_normal(SR)).astype(np.float32)
+
+@pytest.fixture
+def wav_path(signal, tmp_path):
+    import soundfile as sf
+    path = str(tmp_path / "input.wav")
+    sf.write(path, signal, SR, subtype='FLOAT')
+    return path
+
+def run_session(path, model):
+    streams = []
+
+    def stream_factory(**kwargs):
+        streams.append(FileStream(path, **kwargs))
+        return streams[-1]
+
+    session = LiveSession(RealtimeDenoiser(model, CHUNK_SIZE, OVERLAP), SR, BLOCKSIZE, JITTER, stream_factory)
+    session.start()
+    stream = streams[0]
+    stream.wait()
+    stats = session.stats()
+    session.stop()
+    return np.concatenate(stream.output), stats
+
+def test_live_session_matches_offline_overlap_add(signal, wav_path):
+    model = CenteringModel()
+    played, stats = run_session(wav_path, model)
+    assert stats['underruns'] == 0
+    assert stats['overruns'] == 0
+
+    # Silence until the first hop is denoised, then the jitter prefill and
+    # the overlap delay ahead of the signal
+    start = len(played) - stats['samples_out'] + JITTER + OVERLAP
+    streamed = played[start:]
+    frames = model.infer_chunks(AudioProcessor.frame_audio(signal, CHUNK_SIZE, OVERLAP))
+    offline = AudioProcessor.overlap_add(frames, len(signal), OVERLAP)
+    assert len(streamed) > SR // 2
+    np.testing.assert_allclose(streamed, offline[:len(streamed)], atol=1e-6)
+
+def test_live_session_latency_matches_estimate(wav_path):
+    model = CenteringModel()
+    _, stats = run_session(wav_path, model)
+    _, _, expected = choose_chunk_size(model, latency_budget=1.0, sample_rate=SR, candidates=(CHUNK_SIZE,),
+                                       overlap_ratio=OVERLAP / CHUNK_SIZE, jitter=JITTER)
+    # Capture happens a whole device block at a time
+    tolerance = BLOCKSIZE / SR + 0.02
+    assert stats['latency_mean'] == pytest.approx(expected, abs=tolerance)
+    assert stats['latency_max'] < expected + tolerance + 0.05
+
+def test_overruns_count_dropped_input():
+    session = LiveSession(RealtimeDenoiser(CenteringModel(), CHUNK_SIZE, OVERLAP), SR, BLOCKSIZE, JITTER,
+                          stream_factory=lambda **kwargs: None)
+    capacity = 4 * (CHUNK_SIZE + BLOCKSIZE + JITTER)
+    block = np.ones((BLOCKSIZE, 1), dtype=np.float32)
+    outdata = np.zeros_like(block)
+    blocks = capacity // BLOCKSIZE + 10
+    # No worker runs, so captured input piles up
+    for _ in range(blocks):
+        session._callback(block, outdata, BLOCKSIZE, None, None)
+    stats = session.stats()
+    assert stats['overruns'] == blocks * BLOCKSIZE - capacity
+    assert stats['samples_in'] == blocks * BLOCKSIZE
+    assert stats['underruns'] == 0
+
+def test_ring_buffer_wraps():
+    buffer = RingBuffer(5)
+    assert buffer.write(np.arange(4, dtype=np.float32)) == 0
+    np.testing.assert_array_equal(buffer.read(3), [0, 1, 2])
+    assert buffer.write(np.arange(4, 8, dtype=np.float32)) == 0
+    assert buffer.write(np.array([8, 9], dtype=np.float32)) == 2
+    np.testing.assert_array_equal(buffer.read(10), [5, 6, 7, 8, 9])
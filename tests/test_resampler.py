@@ -0,0 +1,37 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from resampler import QUALITY_TIERS, create_streaming_resampler, resample
+
+RATES = [(44100, 16000), (22050, 16000), (8000, 16000), (48000, 16000)]
+
+def resample_in_blocks(samples, orig_sr, target_sr, quality, sizes):
+    resampler = create_streaming_resampler(orig_sr, target_sr, quality)
+    outputs = []
+    start = 0
+    for size in itertools.cycle(sizes):
+        if start >= len(samples):
+            break
+        outputs.append(resampler.process(samples[start:start + size]))
+        start += size
+    outputs.append(resampler.flush())
+    return np.concatenate(outputs)
+
+@pytest.fixture
+def signal():
+    rng = np.random.default_rng(0)
+    t = np.arange(30011) / 44100
+    return (0.5 * np.sin(2 * np.pi * 1000 * t) + 0.1 * rng.standard_normal(len(t))).astype(np.float32)
+
+@pytest.mark.parametrize("quality", QUALITY_TIERS)
+@pytest.mark.parametrize("orig_sr, target_sr", RATES)
+def test_blocks_match_one_shot(signal, quality, orig_sr, target_sr):
+    # Block sizes that are not multiples of the rate ratio, one of a single sample
+    sizes = [1001, 1, 4097, 333]
+    expected = resample(signal, orig_sr, target_sr, quality)
+    streamed = resample_in_blocks(signal, orig_sr, target_sr, quality, sizes)
+    assert streamed.dtype == np.float32
+    assert len(streamed) == len(expected)
+    np.testing.assert_array_equal(streamed, expected)
@@ -0,0 +1,46 @@
+import numpy as np
+
+from audio_processor import AudioProcessor
+from result_cache import ResultCache
+
+class CountingHandler:
+    """Stand-in model handler that records how often each backend runs"""
+    audio_processor = AudioProcessor()
+    model_id = "counting"
+
+    def __init__(self):
+        self.calls = []
+
+    def predict(self, audio, batching_size, overlap=0, window=None, progress=None):
+        self.calls.append(('keras', overlap))
+        return audio.samples * 0.5
+
+    def predict_tflite(self, audio, tflite_model_path, batching_size, progress=None):
+        self.calls.append(('tflite', None))
+        return audio.samples * 0.25
+
+def test_put_caches_without_copy(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    array = np.arange(8, dtype=np.float32)
+    cached = cache.put("key", array)
+    assert cached is array
+    assert not cached.flags.writeable
+    assert cache.get("key") is array
+    cache.clear_memory()
+    np.testing.assert_array_equal(cache.get("key"), array)
+
+def test_tflite_key_ignores_overlap(tmp_path):
+    model = tmp_path / "model.tflite"
+    model.write_bytes(b"tflite")
+    handler = CountingHandler()
+    cache = ResultCache(None)
+    audio = np.linspace(-1, 1, 16000, dtype=np.float32)
+
+    first = cache.denoise(handler, audio, overlap=1000, tflite_model_path=str(model))
+    second = cache.denoise(handler, audio, overlap=2000, window='linear', tflite_model_path=str(model))
+    assert handler.calls == [('tflite', None)]
+    assert second is first
+
+    cache.denoise(handler, audio, overlap=1000)
+    cache.denoise(handler, audio, overlap=2000)
+    assert handler.calls[1:] == [('keras', 1000), ('keras', 2000)]
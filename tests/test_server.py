@@ -0,0 +1,77 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from audio_processor import AudioProcessor
+from server import DenoiseServer, HTTPError, MicroBatcher, ServerBusy
+
+class IdentityModel:
+    """Returns its chunks, enough to exercise batching"""
+    def infer_chunks(self, chunks, batch_size=None):
+        return chunks
+
+class IdentityHandler(IdentityModel):
+    audio_processor = AudioProcessor()
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+def test_submit_returns_own_chunks():
+    async def main():
+        batcher = MicroBatcher(IdentityModel(), max_batch_chunks=8, max_wait=0.01, max_queued_chunks=16)
+        batcher.start()
+        try:
+            inputs = [np.full((n, 4), n, dtype=np.float32) for n in (1, 2, 3)]
+            outputs = await asyncio.gather(*(batcher.submit(chunks) for chunks in inputs))
+        finally:
+            await batcher.stop()
+        for chunks, output in zip(inputs, outputs):
+            np.testing.assert_array_equal(output, chunks)
+        assert batcher.queued_chunks == 0
+    run(main())
+
+def test_oversized_request_is_413():
+    async def main():
+        batcher = MicroBatcher(IdentityModel(), max_queued_chunks=4)
+        batcher.start()
+        try:
+            with pytest.raises(HTTPError) as error:
+                await batcher.submit(np.zeros((5, 4), dtype=np.float32))
+            assert error.value.status == 413
+            assert not isinstance(error.value, ServerBusy)
+            # Exactly the limit is admitted on an empty queue
+            output = await batcher.submit(np.zeros((4, 4), dtype=np.float32))
+            assert len(output) == 4
+        finally:
+            await batcher.stop()
+    run(main())
+
+def test_full_queue_is_503():
+    async def main():
+        batcher = MicroBatcher(IdentityModel(), max_wait=0.05, max_queued_chunks=4)
+        batcher.start()
+        try:
+            first = asyncio.ensure_future(batcher.submit(np.zeros((3, 4), dtype=np.float32)))
+            await asyncio.sleep(0)
+            with pytest.raises(ServerBusy):
+                await batcher.submit(np.zeros((2, 4), dtype=np.float32))
+            await first
+        finally:
+            await batcher.stop()
+    run(main())
+
+def test_raw_pcm_is_big_endian():
+    server = DenoiseServer(IdentityHandler())
+    samples = np.array([0.5, -0.25, 0.0], dtype=np.float32)
+    body = (samples * 32768).astype('>i2').tobytes()
+    decoded, raw = server._decode({'content-type': 'audio/l16; rate=16000'}, '', body)
+    assert raw
+    np.testing.assert_array_equal(decoded, samples)
+    assert server._encode(decoded, True) == body
+
+@pytest.mark.parametrize("content_type", ['audio/l16', 'audio/l16; rate=0', 'audio/l16; rate=-8000'])
+def test_raw_pcm_needs_positive_rate(content_type):
+    with pytest.raises(HTTPError) as error:
+        DenoiseServer(IdentityHandler())._decode({'content-type': content_type}, '', b"\x00\x01")
+    assert error.value.status == 400
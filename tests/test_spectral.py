@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from filters import AudioFilters
+from setup import Setup
+from spectral import QuantileSketch, Spectrogram, StreamingSpectralGate
+
+SR = 16000
+N_BINS = Setup.SPECTRAL_GATE_N_FFT // 2 + 1
+
+@pytest.fixture(scope="module")
+def stationary():
+    """Ten seconds of a steady tone in white noise"""
+    rng = np.random.default_rng(0)
+    t = np.arange(10 * SR) / SR
+    return (0.3 * np.sin(2 * np.pi * 440 * t) + 0.1 * rng.standard_normal(len(t))).astype(np.float32)
+
+@pytest.fixture(scope="module")
+def batch_gated(stationary):
+    return AudioFilters.spectral_gating(stationary, SR)
+
+def gate_in_blocks(gate, samples, block_size=4097):
+    outputs = [gate.process(samples[start:start + block_size]) for start in range(0, len(samples), block_size)]
+    return np.concatenate(outputs + [gate.flush()])
+
+def relative_error(output, reference):
+    return np.linalg.norm(output - reference) / np.linalg.norm(reference)
+
+class ExactMedian:
+    """Sketch stand-in holding the exact median of a whole spectrogram"""
+    def __init__(self, magnitude):
+        self.median = np.median(magnitude, axis=-1, keepdims=True)
+
+    def update(self, magnitude):
+        pass
+
+    def quantile(self, q=0.5):
+        return self.median
+
+def test_sketch_median_is_close_to_exact(stationary):
+    magnitude = Spectrogram(stationary, SR).magnitude
+    sketch = QuantileSketch(N_BINS)
+    sketch.update(magnitude)
+    error = np.abs(sketch.quantile() / np.median(magnitude, axis=-1, keepdims=True) - 1)
+    # Within a bucket of the exact median, half a bucket on average
+    assert error.max() < 10 ** (Setup.STREAM_GATE_RESOLUTION_DB / 20) - 1
+    assert error.mean() < 10 ** (Setup.STREAM_GATE_RESOLUTION_DB / 40) - 1
+
+def test_streaming_gate_with_exact_median_equals_batch(stationary, batch_gated):
+    gate = StreamingSpectralGate(sketch=ExactMedian(Spectrogram(stationary, SR).magnitude), update=False)
+    output = gate_in_blocks(gate, stationary)
+    assert len(output) == len(stationary)
+    np.testing.assert_allclose(output[:len(batch_gated)], batch_gated, atol=1e-5)
+
+def test_two_pass_gate_is_close_to_batch(stationary, batch_gated):
+    sketch = QuantileSketch(N_BINS, decay=1.0)
+    analysis = StreamingSpectralGate(sketch=sketch)
+    for start in range(0, len(stationary), 4097):
+        analysis.observe(stationary[start:start + 4097])
+    analysis.observe(None)
+    output = gate_in_blocks(StreamingSpectralGate(sketch=sketch, update=False), stationary)
+    assert relative_error(output[:len(batch_gated)], batch_gated) < 0.06
+
+def test_running_median_converges_to_batch(stationary, batch_gated):
+    output = gate_in_blocks(StreamingSpectralGate(), stationary)[:len(batch_gated)]
+    errors = [relative_error(output[start:start + SR], batch_gated[start:start + SR])
+              for start in range(0, 9 * SR, 3 * SR)]
+    # Early frames are gated with a median of few frames, later ones approach the batch result
+    assert errors[0] > errors[1] > errors[2]
+    assert errors[-1] < 0.15
+
+@pytest.mark.parametrize("block_size", [1, 777, 24000])
+def test_zero_threshold_is_identity(stationary, block_size):
+    samples = stationary[:3 * SR]
+    output = gate_in_blocks(StreamingSpectralGate(threshold=0), samples, block_size)
+    assert len(output) == len(samples)
+    np.testing.assert_allclose(output, samples, atol=1e-6)
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from audio_processor import AudioProcessor
+from resampler import QUALITY_TIERS
+from setup import Setup
+from streaming import StreamingDenoiser
+
+@pytest.fixture(scope="module")
+def wav_44k(tmp_path_factory):
+    import soundfile as sf
+    rng = np.random.default_rng(0)
+    sample_rate = 44100
+    t = np.arange(int(3.3 * sample_rate)) / sample_rate
+    samples = 0.4 * np.sin(2 * np.pi * 440 * t) + 0.05 * rng.standard_normal(len(t))
+    path = str(tmp_path_factory.mktemp("streaming") / "input.wav")
+    sf.write(path, samples.astype(np.float32), sample_rate, subtype='PCM_16')
+    return path
+
+@pytest.mark.parametrize("quality", QUALITY_TIERS)
+def test_streaming_matches_predict(tiny_model, wav_44k, tmp_path, quality):
+    import soundfile as sf
+    from model_handler import ModelHandler
+
+    model_handler = ModelHandler(tiny_model, AudioProcessor(resample_quality=quality), artifact_format='keras')
+    # Two chunks per block, so the 3.3 s input spans several blocks and a partial one
+    denoiser = StreamingDenoiser(model_handler, block_chunks=2)
+    output_path = str(tmp_path / "output.wav")
+    written = denoiser.process(wav_44k, output_path)
+
+    expected = AudioProcessor.to_pcm16(model_handler.predict(wav_44k, Setup.BATCH_SIZE, overlap=0))
+    streamed, sample_rate = sf.read(output_path, dtype='int16')
+    assert sample_rate == Setup.SAMPLE_RATE
+    assert written == len(expected) > 2 * denoiser.block_size
+    np.testing.assert_array_equal(streamed, expected)